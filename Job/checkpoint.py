@@ -0,0 +1,146 @@
+import os
+import json
+import threading
+
+from redis_client import get_redis
+
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND")  # local | redis | none
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", ".checkpoints")
+CHECKPOINT_TTL = int(os.getenv("CHECKPOINT_TTL", str(3 * 24 * 3600)))
+
+
+class NullCheckpointStore:
+    def load(self, prompt_id: str) -> dict:
+        return {}
+
+    def set_field(self, prompt_id: str, field: str, value):
+        pass
+
+
+class LocalCheckpointStore:
+    """
+    One JSON file per prompt. Only survives a pod retry when CHECKPOINT_DIR
+    is on a volume shared by the retried pods.
+    """
+
+    def __init__(self, root: str = CHECKPOINT_DIR):
+        self.root = root
+        # Pipeline stages write from different threads; each write rewrites the file
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, prompt_id: str) -> str:
+        return os.path.join(self.root, f"{prompt_id}.json")
+
+    def load(self, prompt_id: str) -> dict:
+        try:
+            with open(self._path(prompt_id), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def set_field(self, prompt_id: str, field: str, value):
+        with self.lock:
+            data = self.load(prompt_id)
+            data[field] = value
+            tmp_path = f"{self._path(prompt_id)}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self._path(prompt_id))
+
+
+class RedisCheckpointStore:
+    """
+    One Redis hash per prompt, field values JSON-encoded. Shared by every pod
+    so a retried Job resumes wherever the previous pod got to.
+    """
+
+    def __init__(self, client, ttl: int = CHECKPOINT_TTL):
+        self.client = client
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(prompt_id: str) -> str:
+        return f"checkpoint:{prompt_id}"
+
+    def load(self, prompt_id: str) -> dict:
+        raw = self.client.hgetall(self._key(prompt_id))
+        return {field: json.loads(value) for field, value in raw.items()}
+
+    def set_field(self, prompt_id: str, field: str, value):
+        pipe = self.client.pipeline()
+        pipe.hset(self._key(prompt_id), field, json.dumps(value))
+        pipe.expire(self._key(prompt_id), self.ttl)
+        pipe.execute()
+
+
+def get_checkpoint_store():
+    backend = (CHECKPOINT_BACKEND or ("redis" if get_redis() else "local")).lower()
+    try:
+        if backend == "none":
+            return NullCheckpointStore()
+        if backend == "redis":
+            client = get_redis()
+            if client is None:
+                raise RuntimeError("CHECKPOINT_BACKEND=redis but REDIS_URL is not set")
+            return RedisCheckpointStore(client)
+        return LocalCheckpointStore()
+    except Exception as e:
+        print(f"Checkpoint store unavailable, running without checkpoints: {e}")
+        return NullCheckpointStore()
+
+
+class Checkpoint:
+    """
+    What a Job has finished for one prompt: the planned chunks, each scene's
+    generated script, each scene's render result and the final upload.
+    Fields are written as soon as each piece of work completes.
+    """
+
+    def __init__(self, prompt_id: str, store=None):
+        self.prompt_id = prompt_id
+        self.store = store or get_checkpoint_store()
+        self.data = self.store.load(prompt_id)
+        if self.data:
+            print(f"Resuming prompt {prompt_id} from checkpoint")
+
+    @property
+    def enabled(self) -> bool:
+        return not isinstance(self.store, NullCheckpointStore)
+
+    def _set(self, field: str, value):
+        self.data[field] = value
+        try:
+            self.store.set_field(self.prompt_id, field, value)
+        except Exception as e:
+            print(f"Failed to write checkpoint field {field}: {e}")
+
+    def plan(self) -> list:
+        return list(self.data.get("plan", []))
+
+    def save_chunk(self, chunk: dict):
+        self._set("plan", self.plan() + [chunk])
+
+    def plan_sent(self) -> bool:
+        return bool(self.data.get("plan_sent"))
+
+    def mark_plan_sent(self):
+        self._set("plan_sent", True)
+
+    def script(self, scene_id: str) -> str | None:
+        return self.data.get(f"script:{scene_id}")
+
+    def save_script(self, scene_id: str, source: str):
+        self._set(f"script:{scene_id}", source)
+
+    def render(self, scene_id: str) -> dict | None:
+        return self.data.get(f"render:{scene_id}")
+
+    def save_render(self, scene_id: str, result: dict):
+        self._set(f"render:{scene_id}", result)
+
+    def final_url(self) -> str | None:
+        return self.data.get("final_url")
+
+    def save_final_url(self, url: str):
+        self._set("final_url", url)
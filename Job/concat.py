@@ -0,0 +1,130 @@
+import os
+import json
+import shutil
+import subprocess
+from collections import Counter
+
+CONCAT_LIST_NAME = "concat_list.txt"
+# Stream parameters that must match for `ffmpeg -f concat -c copy` to be a pure stream copy
+VIDEO_PARAMS = ("codec_name", "profile", "width", "height", "pix_fmt", "r_frame_rate", "time_base")
+
+
+def probe_clip(path: str) -> dict:
+    """
+    Returns the clip's duration and video/audio codec parameters via ffprobe.
+    """
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration:stream=codec_type,codec_name,profile,width,height,pix_fmt,r_frame_rate,time_base,sample_rate,channels",
+        "-of", "json",
+        path,
+    ]
+    output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    info = json.loads(output)
+    video = next((s for s in info.get("streams", []) if s.get("codec_type") == "video"), {})
+    audio = next((s for s in info.get("streams", []) if s.get("codec_type") == "audio"), None)
+    return {
+        "duration": float(info.get("format", {}).get("duration", 0.0)),
+        "video": {key: video.get(key) for key in VIDEO_PARAMS},
+        "audio": {key: audio.get(key) for key in ("codec_name", "sample_rate", "channels")} if audio else None,
+    }
+
+
+def codec_signature(codec: dict) -> str:
+    return json.dumps({"video": codec.get("video"), "audio": codec.get("audio")}, sort_keys=True)
+
+
+def remove_partial_files(media_dir: str):
+    """
+    Deletes Manim's per-animation partial_movie_files once the scene's final
+    clip exists; they are only needed to assemble that clip.
+    """
+    for root, dirs, files in os.walk(media_dir):
+        if "partial_movie_files" in dirs:
+            shutil.rmtree(os.path.join(root, "partial_movie_files"), ignore_errors=True)
+            dirs.remove("partial_movie_files")
+
+
+def normalize_clip(path: str, target: dict) -> str:
+    """
+    Re-encodes a clip to the target codec parameters so it can be stream-copied
+    alongside the others.
+    """
+    video = target["video"]
+    normalized_path = f"{os.path.splitext(path)[0]}.normalized.mp4"
+    cmd = [
+        "ffmpeg", "-v", "error", "-y",
+        "-i", path,
+        "-c:v", "libx264" if video.get("codec_name") == "h264" else video.get("codec_name"),
+        "-pix_fmt", video.get("pix_fmt"),
+        "-r", video.get("r_frame_rate"),
+        "-vf", f"scale={video.get('width')}:{video.get('height')}",
+    ]
+    if target.get("audio"):
+        cmd += ["-c:a", target["audio"]["codec_name"], "-ar", str(target["audio"]["sample_rate"]), "-ac", str(target["audio"]["channels"])]
+    else:
+        cmd += ["-an"]
+    cmd.append(normalized_path)
+    subprocess.run(cmd, check=True, capture_output=True, text=True)
+    return normalized_path
+
+
+def load_manifest(manifest_path: str) -> list:
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def concat_clips(manifest: list, output_file: str, workdir: str = ".") -> bool:
+    """
+    Concatenates the rendered clips listed in the manifest, in manifest order.
+    Clips whose codec parameters differ from the majority are re-encoded first
+    so the concat itself stays a stream copy.
+    """
+    clips = [
+        item for item in manifest
+        if item.get("status") == "rendered" and item.get("video_path") and os.path.exists(item["video_path"])
+    ]
+    skipped = [item["scene_id"] for item in manifest if item not in clips]
+    if skipped:
+        print(f"Skipping scenes without a rendered clip: {', '.join(skipped)}")
+    if not clips:
+        print("No rendered clips in the manifest to concatenate.")
+        return False
+
+    for item in clips:
+        if not item.get("codec"):
+            item["codec"] = probe_clip(item["video_path"])
+            item["duration"] = item["codec"]["duration"]
+
+    signatures = Counter(codec_signature(item["codec"]) for item in clips)
+    target_signature, _ = signatures.most_common(1)[0]
+    target = json.loads(target_signature)
+    for item in clips:
+        if codec_signature(item["codec"]) != target_signature:
+            print(f"Clip for {item['scene_id']} has different codec parameters, re-encoding it...")
+            item["video_path"] = normalize_clip(item["video_path"], target)
+
+    print("Concatenating the following clips in order:")
+    for item in clips:
+        print(f" - {item['scene_id']} ({item.get('duration', 0):.1f}s): {item['video_path']}")
+
+    concat_list_path = os.path.join(workdir, CONCAT_LIST_NAME)
+    with open(concat_list_path, "w") as f:
+        for item in clips:
+            # FFMPEG concat format: file 'path/to/file.mp4'
+            safe_path = os.path.abspath(item["video_path"]).replace("\\", "/").replace("'", "'\\''")
+            f.write(f"file '{safe_path}'\n")
+
+    print(f"Created {concat_list_path}. Starting FFMPEG...")
+    cmd = [
+        "ffmpeg",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", concat_list_path,
+        "-c", "copy",
+        "-y", # Overwrite output
+        output_file
+    ]
+    subprocess.run(cmd, check=True)
+    print(f"Successfully created full video: {output_file}")
+    return True
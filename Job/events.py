@@ -0,0 +1,58 @@
+import json
+import time
+from contextlib import contextmanager
+
+from redis_client import get_redis
+
+# Must match PrimaryBackend/internal_redis/events.py and stage_events.py
+EVENT_CHANNEL_PREFIX = "prompt_events:"
+STAGE_EVENT_STREAM = "stage_events"
+STAGE_EVENT_STREAM_MAXLEN = 100000
+
+
+def publish_event(prompt_id: str, event: str, data: dict, record: bool = False):
+    """
+    Best-effort push to the prompt's event channel; clients that miss an
+    event catch up from the backend's snapshot. With record=True the event is
+    also appended to the stage event stream the backend persists.
+    """
+    client = get_redis()
+    if client is None or not prompt_id:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.publish(f"{EVENT_CHANNEL_PREFIX}{prompt_id}", json.dumps({"event": event, "data": data}))
+        if record:
+            record_data = {"prompt_id": prompt_id, **data}
+            pipe.xadd(STAGE_EVENT_STREAM, {"event": json.dumps(record_data)}, maxlen=STAGE_EVENT_STREAM_MAXLEN, approximate=True)
+        pipe.execute()
+    except Exception as e:
+        print(f"Failed to publish {event} event: {e}")
+
+
+@contextmanager
+def stage(prompt_id: str, name: str, **detail):
+    """
+    Publishes progress around a pipeline stage: a live "started" event, then
+    a "completed" or "failed" record with start/end timestamps that the
+    backend persists on the prompt. detail (chunk, scene, attempt, ...) is
+    carried on both. Stages that fail without raising set outcome["status"].
+    """
+    started = time.time()
+    publish_event(prompt_id, "stage", {"stage": name, "status": "started", "started_at": started, "detail": detail})
+    outcome = {"status": "completed"}
+    try:
+        yield outcome
+    except BaseException:
+        outcome["status"] = "failed"
+        raise
+    finally:
+        ended = time.time()
+        publish_event(prompt_id, "stage", {
+            "stage": name,
+            "status": outcome["status"],
+            "started_at": started,
+            "ended_at": ended,
+            "seconds": ended - started,
+            "detail": detail,
+        }, record=True)
@@ -0,0 +1,138 @@
+import os
+import subprocess
+
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "4"))
+# Streaming mode: re-encodes and uploads every clip as it finishes, so it is opt-in
+HLS_ENABLED = os.getenv("HLS_ENABLED", "0") == "1"
+PLAYLIST_NAME = "index.m3u8"
+
+
+def segment_clip(clip_path: str, out_dir: str, prefix: str, segment_seconds: int = HLS_SEGMENT_SECONDS) -> list:
+    """
+    Cuts one clip into HLS segments and returns [(duration, segment_path)].
+    Keyframes are forced on the segment boundary so no segment is longer than
+    segment_seconds and the playlist's target duration holds for every clip.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    clip_playlist = os.path.join(out_dir, f"{prefix}.m3u8")
+    cmd = [
+        "ffmpeg", "-v", "error", "-y",
+        "-i", clip_path,
+        "-c:v", "libx264", "-preset", "veryfast",
+        "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})",
+        "-sc_threshold", "0",
+        "-c:a", "aac",
+        "-f", "hls",
+        "-hls_time", str(segment_seconds),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_filename", os.path.join(out_dir, f"{prefix}_%04d.ts"),
+        clip_playlist,
+    ]
+    subprocess.run(cmd, check=True, capture_output=True, text=True)
+
+    segments = []
+    duration = None
+    with open(clip_playlist, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].split(",")[0])
+            elif line and not line.startswith("#") and duration is not None:
+                segments.append((duration, os.path.join(out_dir, line)))
+                duration = None
+    return segments
+
+
+class HlsPublisher:
+    """
+    Builds a growing HLS playlist for one prompt. Clips may finish in any
+    order; they are published strictly in the order the scenes were expected,
+    each as soon as every earlier scene is either published or skipped.
+    """
+
+    def __init__(self, prompt_id: str, storage, workdir: str = "hls", on_first_publish=None):
+        self.prompt_id = prompt_id
+        self.storage = storage
+        self.workdir = workdir
+        self.on_first_publish = on_first_publish
+        self.order = []
+        self.ready = {}
+        self.next_index = 0
+        self.entries = []  # playlist lines after the header
+        self.playlist_url = None
+        os.makedirs(workdir, exist_ok=True)
+
+    def _key(self, name: str) -> str:
+        return f"hls/{self.prompt_id}/{name}"
+
+    def expect(self, scene_id: str):
+        self.order.append(scene_id)
+
+    def add_clip(self, scene_id: str, clip_path: str):
+        self.ready[scene_id] = clip_path
+        self._flush()
+
+    def skip(self, scene_id: str):
+        self.ready[scene_id] = None
+        self._flush()
+
+    def _flush(self):
+        published = False
+        while self.next_index < len(self.order) and self.order[self.next_index] in self.ready:
+            scene_id = self.order[self.next_index]
+            clip_path = self.ready.pop(scene_id)
+            self.next_index += 1
+            if clip_path:
+                try:
+                    self._publish_clip(scene_id, clip_path)
+                    published = True
+                except Exception as e:
+                    print(f"[{scene_id}] Failed to publish HLS segments: {e}")
+        if published:
+            self._upload_playlist(final=False)
+
+    def _publish_clip(self, scene_id: str, clip_path: str):
+        segments = segment_clip(clip_path, os.path.join(self.workdir, scene_id), scene_id)
+        lines = []
+        for duration, segment_path in segments:
+            url = self.storage.put_file(segment_path, self._key(os.path.basename(segment_path)), "video/mp2t")
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(url)
+        # Each clip is encoded separately, so timestamps restart at its boundary
+        if self.entries:
+            self.entries.append("#EXT-X-DISCONTINUITY")
+        self.entries.extend(lines)
+        print(f"[{scene_id}] Published {len(segments)} HLS segment(s)")
+
+    def _upload_playlist(self, final: bool):
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{HLS_SEGMENT_SECONDS}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+        ]
+        lines.extend(self.entries)
+        if final:
+            lines.append("#EXT-X-ENDLIST")
+
+        playlist_path = os.path.join(self.workdir, PLAYLIST_NAME)
+        with open(playlist_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        url = self.storage.put_file(playlist_path, self._key(PLAYLIST_NAME), "application/vnd.apple.mpegurl")
+        if self.playlist_url is None:
+            self.playlist_url = url
+            print(f"HLS playlist available at {url}")
+            if self.on_first_publish:
+                self.on_first_publish(url)
+
+    def finish(self):
+        """
+        Publishes whatever is still pending in order and closes the playlist.
+        """
+        for scene_id in self.order[self.next_index:]:
+            self.ready.setdefault(scene_id, None)
+        self._flush()
+        if self.entries:
+            self._upload_playlist(final=True)
+        return self.playlist_url
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+from redis_client import get_redis
+
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND")  # sqlite | redis | none
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# How often a Redis cache over its budget looks for entries the TTL already removed
+LLM_CACHE_PRUNE_SECONDS = int(os.getenv("LLM_CACHE_PRUNE_SECONDS", "300"))
+
+
+def cache_key(model: str, messages: list, response_format: dict | None = None) -> str:
+    """
+    Content address of an LLM call: identical requests map to the same key.
+    """
+    payload = json.dumps(
+        {"model": model, "messages": messages, "response_format": response_format},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class NullCache:
+    def get(self, key: str):
+        return None
+
+    def set(self, key: str, value: str):
+        pass
+
+
+class SQLiteCache:
+    """
+    Local disk cache. Entries expire after ttl seconds and the least recently
+    used entries are evicted once the stored responses exceed max_bytes.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: int = LLM_CACHE_TTL, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+
+    def _connect(self):
+        # A connection per call keeps the cache safe to use from threads and
+        # from forked render workers.
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, key: str):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            value, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            if self.ttl:
+                conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY last_used ASC").fetchall():
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+class RedisCache:
+    """
+    Shared cache, so a retried pod or another job can reuse responses.
+    Entries expire with the Redis TTL; a sorted set of last-use times drives
+    LRU eviction once the stored responses exceed max_bytes. The sizes hash
+    keeps a running total so a write does not have to sum every entry.
+    """
+
+    TOTAL_FIELD = "_total"
+
+    def __init__(self, client, ttl: int = LLM_CACHE_TTL, max_bytes: int = LLM_CACHE_MAX_BYTES, prefix: str = "llm_cache"):
+        self.client = client
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self.lru_key = f"{prefix}:lru"
+        self.sizes_key = f"{prefix}:sizes"
+        self.last_prune = None
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get(self, key: str):
+        value = self.client.get(self._key(key))
+        if value is not None:
+            self.client.zadd(self.lru_key, {key: time.time()})
+        return value
+
+    def set(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        previous = self.client.hget(self.sizes_key, key)
+        pipe = self.client.pipeline()
+        pipe.set(self._key(key), value, ex=self.ttl or None)
+        pipe.zadd(self.lru_key, {key: time.time()})
+        pipe.hset(self.sizes_key, key, size)
+        pipe.hincrby(self.sizes_key, self.TOTAL_FIELD, size - int(previous or 0))
+        pipe.execute()
+        self._evict()
+
+    def _total(self) -> int:
+        total = self.client.hget(self.sizes_key, self.TOTAL_FIELD)
+        if total is not None:
+            return int(total)
+        # Sizes written before the running total existed are summed once
+        sizes = self.client.hgetall(self.sizes_key)
+        self.client.hsetnx(self.sizes_key, self.TOTAL_FIELD, sum(int(v) for v in sizes.values()))
+        return int(self.client.hget(self.sizes_key, self.TOTAL_FIELD))
+
+    def _forget(self, key: str) -> int:
+        """
+        Drops a key's size from the hash and the running total. Only the
+        caller whose HDEL succeeds subtracts it, so concurrent evictions do
+        not count an entry twice.
+        """
+        size = self.client.hget(self.sizes_key, key)
+        if size is None or not self.client.hdel(self.sizes_key, key):
+            return 0
+        self.client.hincrby(self.sizes_key, self.TOTAL_FIELD, -int(size))
+        return int(size)
+
+    def _prune_expired(self, batch: int = 500):
+        # Entries the TTL already removed still hold their LRU and size records
+        start = 0
+        while True:
+            keys = self.client.zrange(self.lru_key, start, start + batch - 1)
+            if not keys:
+                return
+            pipe = self.client.pipeline(transaction=False)
+            for key in keys:
+                pipe.exists(self._key(key))
+            expired = [key for key, exists in zip(keys, pipe.execute()) if not exists]
+            if expired:
+                self.client.zrem(self.lru_key, *expired)
+                for key in expired:
+                    self._forget(key)
+            start += len(keys) - len(expired)
+
+    def _evict(self):
+        total = self._total()
+        if total <= self.max_bytes:
+            return
+        # Scanning for expired entries is O(n), so it runs at most once per interval
+        if self.last_prune is None or time.monotonic() - self.last_prune >= LLM_CACHE_PRUNE_SECONDS:
+            self.last_prune = time.monotonic()
+            self._prune_expired()
+            total = self._total()
+        while total > self.max_bytes:
+            popped = self.client.zpopmin(self.lru_key)
+            if not popped:
+                break
+            key, _ = popped[0]
+            self.client.delete(self._key(key))
+            total -= self._forget(key)
+
+
+_cache = None
+
+
+def get_cache():
+    """
+    Returns the configured cache. Defaults to Redis when it is configured,
+    otherwise the local SQLite file.
+    """
+    global _cache
+    if _cache is not None:
+        return _cache
+
+    backend = (LLM_CACHE_BACKEND or ("redis" if get_redis() else "sqlite")).lower()
+    try:
+        if backend == "none":
+            _cache = NullCache()
+        elif backend == "redis":
+            client = get_redis()
+            if client is None:
+                raise RuntimeError("LLM_CACHE_BACKEND=redis but REDIS_URL is not set")
+            _cache = RedisCache(client)
+        else:
+            _cache = SQLiteCache()
+    except Exception as e:
+        print(f"LLM cache unavailable, calling the LLM uncached: {e}")
+        _cache = NullCache()
+    return _cache
+
+
+def cache_get(key: str):
+    try:
+        return get_cache().get(key)
+    except Exception as e:
+        print(f"LLM cache read failed: {e}")
+        return None
+
+
+def cache_set(key: str, value: str):
+    try:
+        get_cache().set(key, value)
+    except Exception as e:
+        print(f"LLM cache write failed: {e}")
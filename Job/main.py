@@ -1,14 +1,11 @@
-from llm import process, generate_code, render_videos, all_scene_oneplace
+from pipeline import run_pipeline
 import os
 
 def trigger_process(id: str, prompt: str):
     """
-    Function that accepts id and prompt from the user and calls process.
+    Function that accepts id and prompt from the user and runs the streaming pipeline.
     """
-    memory = process(id, prompt)
-    generate_code(memory, topic=prompt)
-    render_videos()
-    all_scene_oneplace()
+    run_pipeline(id, prompt)
 
 
 if __name__ == "__main__":
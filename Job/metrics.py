@@ -0,0 +1,52 @@
+import time
+import threading
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_samples: dict[str, list[float]] = {}
+
+
+def observe(name: str, value: float):
+    with _lock:
+        _samples.setdefault(name, []).append(value)
+
+
+@contextmanager
+def timer(name: str):
+    """
+    Records how long the wrapped block took, in seconds, under name.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            name: {
+                "count": len(values),
+                "total": sum(values),
+                "avg": sum(values) / len(values),
+                "max": max(values),
+            }
+            for name, values in _samples.items()
+            if values
+        }
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+
+
+def report():
+    stats = snapshot()
+    if not stats:
+        return stats
+    print("Stage timings:")
+    for name, s in stats.items():
+        print(f" - {name}: count={s['count']} total={s['total']:.2f} avg={s['avg']:.2f} max={s['max']:.2f}")
+    return stats
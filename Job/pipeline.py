@@ -0,0 +1,359 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from functools import partial
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from events import stage
+from llm import (
+    plan_chunks, send_plan_to_backend, send_playlist_url, agenerate_scene_code, save_scene_code, all_scene_oneplace,
+    CODEGEN_CONCURRENCY, CODEGEN_TIMEOUT,
+)
+from hls import HlsPublisher, HLS_ENABLED
+from storage import get_storage, scene_clip_key
+from checkpoint import Checkpoint
+from scene_tasks import SceneTaskBoard, SceneReducer, SCENE_POLL_SECONDS, fetch_clip
+from render import CODE_DIR, VIDEO_DIR, render_pool, render_scene, crashed_result, available_cpus, scene_sort_key, write_manifest
+
+# Queue sizes bound how far a fast stage can run ahead of a slow one.
+PLAN_QUEUE_SIZE = int(os.getenv("PLAN_QUEUE_SIZE", "2"))
+RENDER_QUEUE_SIZE = int(os.getenv("RENDER_QUEUE_SIZE", "8"))
+# Render scenes on scene_worker pods across the cluster instead of this pod's pool
+SCENE_FANOUT = os.getenv("SCENE_FANOUT", "0") == "1"
+# Clip uploads and downloads for the render checkpoint run beside the render pool
+CLIP_TRANSFER_WORKERS = int(os.getenv("CLIP_TRANSFER_WORKERS", "2"))
+
+_DONE = object()
+
+
+class JobContext:
+    """
+    Everything one prompt's pipeline run owns. Nothing is kept in module
+    globals, so a long-lived runner can process prompts back to back.
+    """
+
+    def __init__(self, prompt_id: str, text: str, total_chunks: int = 5, workdir: str | None = None):
+        self.prompt_id = prompt_id
+        self.text = text
+        self.total_chunks = total_chunks
+        self.workdir = workdir or "."
+        self.code_dir = os.path.join(workdir, "code") if workdir else CODE_DIR
+        self.video_dir = os.path.join(workdir, "video") if workdir else VIDEO_DIR
+        self.output_file = os.path.join(self.workdir, "final_video.mp4")
+        self.memory = []
+        self.checkpoint = Checkpoint(prompt_id)
+        self.plan_queue = queue.Queue(maxsize=PLAN_QUEUE_SIZE)
+        self.render_queue = queue.Queue(maxsize=RENDER_QUEUE_SIZE)
+        # Finished clips are published to a growing HLS playlist in scene order
+        self.clip_events = queue.Queue() if HLS_ENABLED else None
+
+
+def _plan_stage(ctx: JobContext):
+    try:
+        with stage(ctx.prompt_id, "planning"):
+            # Chunks planned by a previous attempt are replayed instead of regenerated
+            for chunk in ctx.checkpoint.plan():
+                ctx.memory.append(chunk)
+                ctx.plan_queue.put(chunk)
+            chunks = plan_chunks(ctx.text, ctx.total_chunks, ctx.memory, prompt_id=ctx.prompt_id)
+            while True:
+                with metrics.timer("planning"):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                ctx.checkpoint.save_chunk(chunk)
+                ctx.plan_queue.put(chunk)
+            if not ctx.checkpoint.plan_sent() and send_plan_to_backend(ctx.prompt_id, ctx.memory):
+                ctx.checkpoint.mark_plan_sent()
+    except Exception as e:
+        print(f"Planning stage failed: {e}")
+    finally:
+        ctx.plan_queue.put(_DONE)
+
+
+async def _codegen_scene(ctx: JobContext, scene: dict, previous_scene: dict | None, semaphore: asyncio.Semaphore):
+    scene_id = scene.get("scene_id")
+    try:
+        source = ctx.checkpoint.script(scene_id)
+        if source is not None:
+            file_path = save_scene_code(scene_id, source, ctx.code_dir)
+        else:
+            with metrics.timer("codegen"), stage(ctx.prompt_id, "codegen_scene", scene=scene_id):
+                file_path = await agenerate_scene_code(
+                    scene, previous_scene, ctx.text, ctx.code_dir, semaphore, CODEGEN_TIMEOUT
+                )
+            with open(file_path, "r") as f:
+                await asyncio.to_thread(ctx.checkpoint.save_script, scene_id, f.read())
+    except Exception as e:
+        reason = "timed out" if isinstance(e, asyncio.TimeoutError) else e
+        print(f"Error generating code for scene {scene_id}: {reason}")
+        if ctx.clip_events is not None:
+            ctx.clip_events.put(("skip", scene_id, None))
+        return
+    # put() blocks while the render queue is full, so keep it off the event loop
+    await asyncio.to_thread(ctx.render_queue.put, file_path)
+
+
+async def _codegen_stage_async(ctx: JobContext):
+    semaphore = asyncio.Semaphore(CODEGEN_CONCURRENCY)
+    tasks = []
+    previous_scene = None
+    while True:
+        chunk = await asyncio.to_thread(ctx.plan_queue.get)
+        if chunk is _DONE:
+            break
+        # previous_scene only depends on the plan, so every scene of the chunk
+        # can be generated at once without waiting on earlier scenes' code.
+        for scene in chunk.get("scenes", []):
+            if ctx.clip_events is not None:
+                ctx.clip_events.put(("expect", scene.get("scene_id"), None))
+            tasks.append(asyncio.create_task(_codegen_scene(ctx, scene, previous_scene, semaphore)))
+            previous_scene = scene
+    await asyncio.gather(*tasks)
+
+
+def _codegen_stage(ctx: JobContext):
+    try:
+        with stage(ctx.prompt_id, "codegen"):
+            asyncio.run(_codegen_stage_async(ctx))
+    except Exception as e:
+        print(f"Codegen stage failed: {e}")
+    finally:
+        ctx.render_queue.put(_DONE)
+
+
+def _publish_stage(publisher: HlsPublisher, clip_events: queue.Queue):
+    while True:
+        event = clip_events.get()
+        if event is _DONE:
+            break
+        kind, scene_id, clip_path = event
+        try:
+            if kind == "expect":
+                publisher.expect(scene_id)
+            elif kind == "clip":
+                with metrics.timer("hls_publish"):
+                    publisher.add_clip(scene_id, clip_path)
+            else:
+                publisher.skip(scene_id)
+        except Exception as e:
+            print(f"[{scene_id}] HLS publish failed: {e}")
+    try:
+        publisher.finish()
+    except Exception as e:
+        print(f"Failed to finalize HLS playlist: {e}")
+
+
+def _checkpoint_render(ctx: JobContext, scene_id: str, result: dict):
+    # Local files do not survive a pod retry, so the checkpoint points at an uploaded copy
+    if result["status"] == "rendered" and result["video_path"] and not result.get("url"):
+        try:
+            with stage(ctx.prompt_id, "upload_clip", scene=scene_id):
+                result["url"] = get_storage().put_file(
+                    result["video_path"], scene_clip_key(ctx.prompt_id, scene_id), "video/mp4"
+                )
+        except Exception as e:
+            print(f"[{scene_id}] Could not upload clip for the checkpoint: {e}")
+    ctx.checkpoint.save_render(scene_id, result)
+
+
+def _delete_scene_clips(prompt_id: str, manifest: list):
+    # Only needed until the final video exists
+    storage = get_storage()
+    for result in manifest:
+        if result["status"] != "rendered":
+            continue
+        try:
+            storage.delete(scene_clip_key(prompt_id, result["scene_id"]))
+        except Exception as e:
+            print(f"[{result['scene_id']}] Could not delete uploaded clip: {e}")
+
+
+def _restore_render(ctx: JobContext, scene_id: str, previous: dict) -> dict:
+    """
+    Returns the checkpointed render with its clip available locally,
+    downloading it when a previous pod rendered it.
+    """
+    if previous.get("video_path") and os.path.exists(previous["video_path"]):
+        return previous
+    video_path = fetch_clip(previous["url"], os.path.join(ctx.video_dir, scene_id, f"{scene_id}.mp4"))
+    return {**previous, "video_path": video_path}
+
+
+def _render_done(future, ctx: JobContext, file_path: str, in_flight: threading.BoundedSemaphore, transfers,
+                 handled: threading.Event):
+    try:
+        in_flight.release()
+        scene_id = os.path.splitext(os.path.basename(file_path))[0]
+        try:
+            result = future.result()
+        except Exception:
+            result = None
+        if result and ctx.checkpoint.enabled:
+            # Off the pool's result thread, which would otherwise stall on the upload
+            transfers.submit(_checkpoint_render, ctx, scene_id, result)
+        if ctx.clip_events is None:
+            return
+        if result and result["status"] == "rendered" and result["video_path"]:
+            ctx.clip_events.put(("clip", scene_id, result["video_path"]))
+        else:
+            ctx.clip_events.put(("skip", scene_id, None))
+    finally:
+        handled.set()
+
+
+def _local_render_stage(ctx: JobContext, workers: int, pool=None) -> list:
+    # Caps scenes handed to the pool but not finished, so the pool's own
+    # work queue cannot grow without bound either.
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    manifest = []
+    futures = []
+    with (nullcontext(pool) if pool else render_pool(workers)) as render_workers, \
+            ThreadPoolExecutor(max_workers=CLIP_TRANSFER_WORKERS) as transfers:
+        while True:
+            file_path = ctx.render_queue.get()
+            if file_path is _DONE:
+                break
+            in_flight.acquire()
+            scene_id = os.path.splitext(os.path.basename(file_path))[0]
+            previous = ctx.checkpoint.render(scene_id)
+            restored = None
+            if previous and previous["status"] == "rendered" and (previous.get("url") or previous.get("video_path")):
+                try:
+                    restored = _restore_render(ctx, scene_id, previous)
+                    print(f"[{scene_id}] Already rendered, reusing {restored['video_path']}")
+                except Exception as e:
+                    print(f"[{scene_id}] Could not restore checkpointed clip, rendering again: {e}")
+            if restored:
+                future = Future()
+                future.set_result(restored)
+            else:
+                future = render_workers.submit(render_scene, file_path, ctx.video_dir, prompt_id=ctx.prompt_id)
+            handled = threading.Event()
+            future.add_done_callback(partial(
+                _render_done, ctx=ctx, file_path=file_path, in_flight=in_flight, transfers=transfers, handled=handled
+            ))
+            futures.append((file_path, future, handled))
+
+        for file_path, future, handled in futures:
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # A render child died (e.g. OOM-killed) and took the pool with it;
+                # every later scene would fail too, so abort and let the caller retry
+                raise
+            except Exception as e:
+                result = crashed_result(file_path, e)
+            manifest.append(result)
+            # result() returns before done-callbacks run; transfers must still
+            # accept the callback's checkpoint upload when the block exits
+            handled.wait()
+    return manifest
+
+
+def _fanout_render_stage(ctx: JobContext) -> list:
+    """
+    Submits every scene to the Redis scene queue and reduces the clips that
+    render pods report, while codegen is still producing later scenes.
+    """
+    def on_clip(scene_id: str, clip_path: str):
+        if ctx.clip_events is not None:
+            ctx.clip_events.put(("clip", scene_id, clip_path))
+
+    def on_skip(scene_id: str):
+        if ctx.clip_events is not None:
+            ctx.clip_events.put(("skip", scene_id, None))
+
+    reducer = SceneReducer(SceneTaskBoard(ctx.prompt_id), ctx.video_dir, on_clip, on_skip)
+
+    submitting = True
+    while True:
+        if submitting:
+            try:
+                file_path = ctx.render_queue.get(timeout=SCENE_POLL_SECONDS)
+            except queue.Empty:
+                file_path = None
+            if file_path is _DONE:
+                submitting = False
+                reducer.close()
+            elif file_path:
+                scene_id = os.path.splitext(os.path.basename(file_path))[0]
+                with open(file_path, "r") as f:
+                    reducer.submit(scene_id, f.read())
+        else:
+            time.sleep(SCENE_POLL_SECONDS)
+        reducer.poll()
+        if reducer.done():
+            break
+
+    return reducer.manifest()
+
+
+def run_pipeline(prompt_id: str, text: str, total_chunks: int = 5, workdir: str | None = None,
+                 workers: int | None = None, pool=None):
+    """
+    Streams planning -> codegen -> render so that scenes start rendering while
+    later chunks are still being planned and coded, then concatenates the result.
+    Pass a render pool to reuse warm render workers across prompts.
+    """
+    metrics.reset()
+    ctx = JobContext(prompt_id, text, total_chunks, workdir)
+    if ctx.checkpoint.final_url():
+        # A previous attempt finished and its scene clips are already gone
+        print(f"Final video already uploaded: {ctx.checkpoint.final_url()}")
+        return []
+    os.makedirs(ctx.video_dir, exist_ok=True)
+
+    workers = workers or available_cpus()
+
+    planner = threading.Thread(target=_plan_stage, args=(ctx,), daemon=True)
+    coder = threading.Thread(target=_codegen_stage, args=(ctx,), daemon=True)
+    publisher_thread = None
+    if ctx.clip_events is not None:
+        publisher = HlsPublisher(
+            prompt_id,
+            get_storage(),
+            workdir=os.path.join(ctx.video_dir, "hls"),
+            on_first_publish=partial(send_playlist_url, prompt_id),
+        )
+        publisher_thread = threading.Thread(target=_publish_stage, args=(publisher, ctx.clip_events), daemon=True)
+
+    with metrics.timer("pipeline"):
+        planner.start()
+        coder.start()
+        if publisher_thread:
+            publisher_thread.start()
+
+        with stage(prompt_id, "render"):
+            if SCENE_FANOUT:
+                manifest = _fanout_render_stage(ctx)
+            else:
+                manifest = _local_render_stage(ctx, workers, pool)
+
+        for result in manifest:
+            metrics.observe("render", result["seconds"])
+            metrics.observe("validate", result["validate_seconds"])
+            metrics.observe(f"render_cache_{result['cache']}", 1)
+
+        planner.join()
+        coder.join()
+        if publisher_thread:
+            ctx.clip_events.put(_DONE)
+            publisher_thread.join()
+
+        manifest.sort(key=lambda item: scene_sort_key(item["scene_id"]))
+        write_manifest(manifest, ctx.video_dir)
+
+        with metrics.timer("concat_upload"), stage(prompt_id, "concat_upload"):
+            final_url = all_scene_oneplace(ctx.video_dir, output_file=ctx.output_file, prompt_id=prompt_id)
+        if final_url:
+            ctx.checkpoint.save_final_url(final_url)
+            _delete_scene_clips(prompt_id, manifest)
+
+    metrics.report()
+    return manifest
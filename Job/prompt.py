@@ -1,3 +1,29 @@
+# Whitelists enforced on generated scripts by validator.py.
+# Keep these in sync with the lists in system_prompt below.
+ALLOWED_MOBJECTS = {
+    "Text", "Tex", "MathTex", "Circle", "Square", "Rectangle",
+    "Line", "Arrow", "Dot", "Axes", "VGroup",
+}
+ALLOWED_ANIMATIONS = {"FadeIn", "FadeOut", "Write", "Create", "Transform"}
+BANNED_NAMES = {"ImageMobject", "SVGMobject"}
+BANNED_MODULES = {"subprocess", "sys", "io"}
+# Modules a scene script may import besides manim itself
+ALLOWED_MODULES = {"manim", "math", "random", "numpy", "itertools", "functools", "typing", "__future__"}
+
+
+def script_rules() -> str:
+    """
+    The validator's rules as prompt text, for the codegen and fix prompts.
+    """
+    return f"""SCRIPT RULES (scripts breaking these are rejected before rendering):
+                - Manim classes you may call: {", ".join(sorted(ALLOWED_MOBJECTS))}.
+                - Animations you may use: {", ".join(sorted(ALLOWED_ANIMATIONS))}. Transform ONLY between the same object type; otherwise FadeOut then FadeIn.
+                - Any other Manim class (e.g. Indicate, Polygon, Brace, ReplacementTransform) is rejected; build it from the allowed ones or define your own helper.
+                - Do NOT use: {", ".join(sorted(BANNED_NAMES))}, or any external files, images or fonts.
+                - Import only from: {", ".join(sorted(ALLOWED_MODULES - {"__future__"}))}. Never import {", ".join(sorted(BANNED_MODULES))}.
+                - Define exactly one class inheriting from Scene."""
+
+
 system_prompt="""
         # 🎬 LLM TASK — SAFE MANIM CODE GENERATOR (ERROR-RESISTANT)
 
@@ -35,7 +61,8 @@ system_prompt="""
         - **chunk_index**: Current chunk number (1-based)
         - **total_chunks**: Total number of chunks planned
         - **previous_scenes_summary**:  
-        A complete summary of *all previously generated chunks*  
+        A compact digest of *all previously generated chunks*:  
+        chunk titles, core concepts and visual metaphors already used  
         (EMPTY for chunk 1)
         - **target_chunk_duration_minutes**: Approximate length of this chunk
         - **audience_level**: Beginner / Intermediate / Mixed
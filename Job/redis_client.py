@@ -0,0 +1,32 @@
+"""Optional Redis connection shared by the Job's caches and queues.
+"""
+
+import os
+import redis
+
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_PORT = os.getenv("REDIS_PORT")
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+
+_client = None
+
+
+def get_redis():
+    """
+    Returns a shared Redis client, or None when REDIS_URL is not configured.
+    """
+    global _client
+    if _client is not None:
+        return _client
+    if not REDIS_URL:
+        return None
+
+    _client = redis.Redis(
+        host=REDIS_URL,
+        port=REDIS_PORT,
+        decode_responses=True,
+        username="default",
+        password=REDIS_PASSWORD,
+    )
+    print("redis connected🔴🔴🔴🔴🔴🔴")
+    return _client
@@ -0,0 +1,326 @@
+import os
+import re
+import json
+import time
+import traceback
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from llm import fix_manim_code
+from validator import validate_script, format_errors
+from render_cache import get_render_cache, render_cache_key
+from concat import probe_clip, remove_partial_files
+from events import stage
+
+CODE_DIR = "code"
+VIDEO_DIR = "video"
+MANIFEST_NAME = "manifest.json"
+MAX_FIX_ATTEMPTS = 3
+# "api" renders inside the long-lived pool worker through Manim's Python API,
+# "cli" launches a fresh `manim` process for every attempt.
+RENDER_MODE = os.getenv("RENDER_MODE", "api")
+RENDER_QUALITY = "medium_quality"  # same as -qm
+# Execute construct() without writing frames before the real render so runtime
+# errors reach the fix loop early
+RENDER_DRY_RUN = os.getenv("RENDER_DRY_RUN", "1") == "1"
+DRY_RUN_CONFIG = {"dry_run": True, "quality": "low_quality"}
+# Recycle pool workers now and then so leaks in Manim/cairo cannot pile up
+RENDER_MAX_TASKS_PER_CHILD = int(os.getenv("RENDER_MAX_TASKS_PER_CHILD", "20"))
+
+
+def available_cpus() -> int:
+    """
+    Number of CPUs this container is allowed to use.
+    Honours RENDER_WORKERS, then the cgroup CPU quota, then the CPU affinity mask.
+    """
+    override = os.getenv("RENDER_WORKERS")
+    if override:
+        return max(1, int(override))
+
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, int(quota) // int(period))
+    except (OSError, ValueError):
+        pass
+
+    # cgroup v1
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0:
+            return max(1, quota // period)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def scene_sort_key(scene_id: str):
+    """
+    Orders 'chunk_<i>_scene_<j>' ids numerically, unknown ids go last.
+    """
+    chunk_match = re.search(r"chunk_?(\d+)", scene_id.lower())
+    scene_match = re.search(r"scene_?(\d+)", scene_id.lower())
+    chunk_idx = int(chunk_match.group(1)) if chunk_match else 9999
+    scene_idx = int(scene_match.group(1)) if scene_match else 9999
+    return (chunk_idx, scene_idx, scene_id)
+
+
+def find_rendered_video(media_dir: str, scene_class_name: str):
+    # Manim writes <media_dir>/videos/<module>/<quality>/<SceneClass>.mp4
+    videos_dir = os.path.join(media_dir, "videos")
+    for root, dirs, files in os.walk(videos_dir):
+        if "partial_movie_files" in dirs:
+            dirs.remove("partial_movie_files")
+        if f"{scene_class_name}.mp4" in files:
+            return os.path.join(root, f"{scene_class_name}.mp4")
+    return None
+
+
+def warm_render_worker():
+    """
+    Pool initializer: pays the manim/numpy/cairo/pango import and config load
+    once per worker process instead of once per render attempt.
+    """
+    if RENDER_MODE == "api":
+        import manim  # noqa: F401
+
+
+def render_pool(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=warm_render_worker,
+        max_tasks_per_child=RENDER_MAX_TASKS_PER_CHILD,
+    )
+
+
+def render_with_api(file_path: str, scene_class_name: str, media_dir: str, config_overrides: dict | None = None) -> dict:
+    """
+    Renders one scene inside the current process with a per-scene Manim config.
+    Returns {"ok", "output_file", "traceback"} instead of raising.
+    """
+    from manim import tempconfig
+
+    outcome = {"ok": False, "output_file": None, "traceback": None}
+    scene_config = {
+        "quality": RENDER_QUALITY,
+        "media_dir": media_dir,
+        "input_file": file_path,
+        "disable_caching": True,
+        "verbosity": "WARNING",
+        "progress_bar": "none",
+    }
+    scene_config.update(config_overrides or {})
+
+    try:
+        with open(file_path, "r") as f:
+            source = f.read()
+        with tempconfig(scene_config):
+            module_name = os.path.splitext(os.path.basename(file_path))[0]
+            namespace = {"__name__": module_name, "__file__": file_path}
+            exec(compile(source, file_path, "exec"), namespace)
+            scene = namespace[scene_class_name]()
+            scene.render()
+            movie_path = scene.renderer.file_writer.movie_file_path
+            outcome["output_file"] = str(movie_path) if movie_path else None
+        outcome["ok"] = True
+    except Exception:
+        outcome["traceback"] = traceback.format_exc()
+    return outcome
+
+
+def render_with_cli(file_path: str, scene_class_name: str, media_dir: str) -> dict:
+    outcome = {"ok": False, "output_file": None, "traceback": None}
+    cmd = [
+        "manim",
+        "-qm",
+        "--disable_caching",
+        "--media_dir", media_dir,
+        file_path,
+        scene_class_name
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+        outcome["ok"] = True
+        outcome["output_file"] = find_rendered_video(media_dir, scene_class_name)
+    except subprocess.CalledProcessError as e:
+        outcome["traceback"] = e.stderr
+    return outcome
+
+
+def dry_run_scene(file_path: str, scene_class_name: str, media_dir: str) -> dict:
+    """
+    Runs the scene's construct() at the lowest quality without writing any
+    frames or movie files. Returns the same structure as a real render.
+    """
+    if RENDER_MODE == "cli":
+        cmd = ["manim", "-ql", "--dry_run", "--disable_caching", "--media_dir", media_dir, file_path, scene_class_name]
+        try:
+            subprocess.run(cmd, check=True, capture_output=True, text=True)
+            return {"ok": True, "output_file": None, "traceback": None}
+        except subprocess.CalledProcessError as e:
+            return {"ok": False, "output_file": None, "traceback": e.stderr}
+    return render_with_api(file_path, scene_class_name, media_dir, DRY_RUN_CONFIG)
+
+
+def apply_fix(scene_id: str, file_path: str, content: str, error_message: str):
+    filename = os.path.basename(file_path)
+    print(f"[{scene_id}] Attempting to fix {filename}...")
+    fixed_code = fix_manim_code(content, error_message)
+    with open(file_path, "w") as f:
+        f.write(fixed_code)
+    print(f"[{scene_id}] Overwrote {filename} with fixed code.")
+
+
+def render_scene(file_path: str, video_dir: str = VIDEO_DIR, max_retries: int = MAX_FIX_ATTEMPTS, prompt_id: str | None = None):
+    """
+    Renders a single scene script into its own media dir, asking the LLM to fix
+    the script between failed attempts. Runs inside a pool worker.
+    """
+    filename = os.path.basename(file_path)
+    scene_id = os.path.splitext(filename)[0]
+    media_dir = os.path.join(video_dir, scene_id)
+    result = {
+        "scene_id": scene_id,
+        "script": file_path,
+        "status": "failed",
+        "attempts": 0,
+        "video_path": None,
+        "error": None,
+        "seconds": 0.0,
+        "validate_seconds": 0.0,
+        "cache": "miss",
+    }
+    started = time.perf_counter()
+    cache = get_render_cache()
+    # Every version of the script that leads to this clip gets a cache entry,
+    # so the original LLM output hits next time without replaying the fixes.
+    script_keys = []
+
+    try:
+        for attempt in range(max_retries + 1):
+            with open(file_path, "r") as f:
+                content = f.read()
+
+            result["attempts"] = attempt + 1
+
+            key = render_cache_key(content, RENDER_QUALITY)
+            if key not in script_keys:
+                script_keys.append(key)
+            cached_path = os.path.join(media_dir, f"{scene_id}.mp4")
+            try:
+                if cache.get(key, cached_path):
+                    result["status"] = "rendered"
+                    result["error"] = None
+                    result["video_path"] = cached_path
+                    result["cache"] = "hit"
+                    print(f"[{scene_id}] Render cache hit for {filename}")
+                    break
+            except Exception as e:
+                print(f"[{scene_id}] Render cache lookup failed: {e}")
+
+            # Catch syntax errors and rule violations before paying for a Manim launch
+            scene_class_name, errors = validate_script(content)
+            if errors:
+                error_message = format_errors(errors)
+                print(f"[{scene_id}] {filename} failed validation:\n{error_message}")
+                result["error"] = error_message
+                if attempt < max_retries:
+                    apply_fix(scene_id, file_path, content, error_message)
+                else:
+                    print(f"[{scene_id}] {filename} still invalid after {max_retries+1} attempts.")
+                continue
+
+            if RENDER_DRY_RUN:
+                validate_started = time.perf_counter()
+                outcome = dry_run_scene(file_path, scene_class_name, media_dir)
+                validate_seconds = time.perf_counter() - validate_started
+                result["validate_seconds"] += validate_seconds
+                print(f"[{scene_id}] Dry run of {filename} took {validate_seconds:.2f}s")
+                if not outcome["ok"]:
+                    print(f"[{scene_id}] Dry run of {filename} failed:\n{outcome['traceback']}")
+                    result["error"] = outcome["traceback"]
+                    if attempt < max_retries:
+                        apply_fix(scene_id, file_path, content, outcome["traceback"])
+                    else:
+                        print(f"[{scene_id}] {filename} still failing after {max_retries+1} attempts.")
+                    continue
+
+            print(f"[{scene_id}] Rendering {filename} (Attempt {attempt+1}/{max_retries+1}) ...")
+
+            with stage(prompt_id, "render_attempt", scene=scene_id, attempt=attempt + 1) as record:
+                if RENDER_MODE == "cli":
+                    outcome = render_with_cli(file_path, scene_class_name, media_dir)
+                else:
+                    outcome = render_with_api(file_path, scene_class_name, media_dir)
+                if not outcome["ok"]:
+                    record["status"] = "failed"
+
+            if outcome["ok"]:
+                result["status"] = "rendered"
+                result["error"] = None
+                result["video_path"] = outcome["output_file"] or find_rendered_video(media_dir, scene_class_name)
+                print(f"[{scene_id}] Successfully rendered {filename}")
+                if result["video_path"]:
+                    for script_key in script_keys:
+                        try:
+                            cache.put(script_key, result["video_path"])
+                        except Exception as e:
+                            print(f"[{scene_id}] Render cache store failed: {e}")
+                break
+
+            print(f"[{scene_id}] Error rendering {filename}:\n{outcome['traceback']}")
+            result["error"] = outcome["traceback"]
+
+            if attempt < max_retries:
+                apply_fix(scene_id, file_path, content, outcome["traceback"])
+            else:
+                print(f"[{scene_id}] Failed to render {filename} after {max_retries+1} attempts.")
+
+    except Exception as e:
+        print(f"[{scene_id}] Unexpected error processing {filename}: {e}")
+        result["error"] = str(e)
+
+    remove_partial_files(media_dir)
+    if result["status"] == "rendered" and result["video_path"]:
+        try:
+            result["codec"] = probe_clip(result["video_path"])
+            result["duration"] = result["codec"]["duration"]
+        except Exception as e:
+            print(f"[{scene_id}] Could not probe {result['video_path']}: {e}")
+
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def crashed_result(file_path: str, error: Exception):
+    # The worker process itself died (e.g. OOM-killed)
+    scene_id = os.path.splitext(os.path.basename(file_path))[0]
+    print(f"[{scene_id}] Render worker crashed: {error}")
+    return {
+        "scene_id": scene_id,
+        "script": file_path,
+        "status": "failed",
+        "attempts": 0,
+        "video_path": None,
+        "error": str(error),
+        "seconds": 0.0,
+        "validate_seconds": 0.0,
+        "cache": "miss",
+    }
+
+
+def write_manifest(manifest: list, video_dir: str = VIDEO_DIR):
+    manifest_path = os.path.join(video_dir, MANIFEST_NAME)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote render manifest to {manifest_path}")
+    return manifest_path
@@ -0,0 +1,213 @@
+import os
+import ast
+import time
+import shutil
+import hashlib
+from importlib import metadata
+
+import requests
+import cloudinary
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.uploader
+import cloudinary.utils
+
+from redis_client import get_redis
+
+RENDER_CACHE_BACKEND = os.getenv("RENDER_CACHE_BACKEND", "local")  # local | cloudinary | none
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", os.path.join(".cache", "render"))
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(5 * 1024 * 1024 * 1024)))
+RENDER_CACHE_FOLDER = os.getenv("RENDER_CACHE_FOLDER", "prompt2video/render_cache")
+# The shared cache is trimmed at most this often, since listing it goes through the rate-limited Admin API
+RENDER_CACHE_EVICT_INTERVAL = int(os.getenv("RENDER_CACHE_EVICT_INTERVAL", "3600"))
+
+
+def normalize_source(source: str) -> str:
+    # Round-tripping through ast drops comments and formatting differences
+    try:
+        return ast.unparse(ast.parse(source))
+    except SyntaxError:
+        return "\n".join(line.rstrip() for line in source.strip().splitlines() if line.strip())
+
+
+def manim_version() -> str:
+    try:
+        return metadata.version("manim")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def render_cache_key(source: str, quality: str) -> str:
+    payload = "\0".join([normalize_source(source), manim_version(), quality])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class NullRenderCache:
+    def get(self, key: str, dest_path: str) -> bool:
+        return False
+
+    def put(self, key: str, video_path: str):
+        pass
+
+
+class LocalRenderCache:
+    """
+    Stores finished clips as <key>.mp4 in a directory (or mounted PVC).
+    A hit refreshes the file's mtime; the least recently used clips are
+    evicted once the directory exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = RENDER_CACHE_DIR, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp4")
+
+    def get(self, key: str, dest_path: str) -> bool:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        shutil.copyfile(path, dest_path)
+        os.utime(path)
+        return True
+
+    def put(self, key: str, video_path: str):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.copyfile(video_path, tmp_path)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".mp4"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class CloudinaryRenderCache:
+    """
+    Shares clips between Job pods through Cloudinary. Lookups go to the
+    predictable delivery URL instead of the Admin API. Hits stamp a
+    last_used context value which drives LRU eviction once the folder
+    exceeds max_bytes; eviction runs at most once per interval across pods.
+    """
+
+    def __init__(self, folder: str = RENDER_CACHE_FOLDER, max_bytes: int = RENDER_CACHE_MAX_BYTES,
+                 evict_interval: int = RENDER_CACHE_EVICT_INTERVAL):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.evict_interval = evict_interval
+        self.last_evict = None
+
+    def _public_id(self, key: str) -> str:
+        return f"{self.folder}/{key}"
+
+    def _url(self, key: str) -> str:
+        url, _ = cloudinary.utils.cloudinary_url(self._public_id(key), resource_type="video", format="mp4", secure=True)
+        return url
+
+    def get(self, key: str, dest_path: str) -> bool:
+        url = self._url(key)
+        head = requests.head(url, timeout=15, allow_redirects=True)
+        if head.status_code == 404:
+            return False
+        head.raise_for_status()
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        # A download cut short must not leave a truncated clip at dest_path
+        tmp_path = f"{dest_path}.tmp"
+        with requests.get(url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                for block in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(block)
+        os.replace(tmp_path, dest_path)
+        cloudinary.uploader.add_context(
+            {"last_used": str(int(time.time()))}, [self._public_id(key)], resource_type="video"
+        )
+        return True
+
+    def put(self, key: str, video_path: str):
+        cloudinary.uploader.upload(
+            video_path,
+            public_id=self._public_id(key),
+            resource_type="video",
+            overwrite=False,
+            context={"last_used": str(int(time.time()))},
+        )
+        if self._evict_due():
+            self._evict()
+
+    def _evict_due(self) -> bool:
+        # One pod per interval takes the Redis lock; without Redis each process keeps its own clock
+        client = get_redis()
+        if client is not None:
+            return bool(client.set(f"render_cache_evict:{self.folder}", "1", nx=True, ex=self.evict_interval))
+        now = time.monotonic()
+        if self.last_evict is not None and now - self.last_evict < self.evict_interval:
+            return False
+        self.last_evict = now
+        return True
+
+    def _list(self):
+        cursor = None
+        while True:
+            kwargs = {"next_cursor": cursor} if cursor else {}
+            listing = cloudinary.api.resources(
+                type="upload", prefix=self.folder, resource_type="video", context=True, max_results=500, **kwargs
+            )
+            yield from listing.get("resources", [])
+            cursor = listing.get("next_cursor")
+            if not cursor:
+                return
+
+    def _evict(self):
+        entries = []
+        for resource in self._list():
+            custom = resource.get("context", {}).get("custom", {})
+            entries.append((int(custom.get("last_used", 0)), resource.get("bytes", 0), resource["public_id"]))
+        total = sum(size for _, size, _ in entries)
+        for _, size, public_id in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            cloudinary.uploader.destroy(public_id, resource_type="video")
+            total -= size
+
+
+_cache = None
+
+
+def get_render_cache():
+    global _cache
+    if _cache is not None:
+        return _cache
+    backend = RENDER_CACHE_BACKEND.lower()
+    try:
+        if backend == "none":
+            _cache = NullRenderCache()
+        elif backend == "cloudinary":
+            _cache = CloudinaryRenderCache()
+        else:
+            _cache = LocalRenderCache()
+    except Exception as e:
+        print(f"Render cache unavailable, rendering uncached: {e}")
+        _cache = NullRenderCache()
+    return _cache
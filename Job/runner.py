@@ -0,0 +1,201 @@
+"""Long-lived runner: pulls prompt tasks from Redis and runs the pipeline
+back to back in one warm process, reusing a single render pool.
+
+A task is moved (BLMOVE) into a processing list rather than popped, and
+stays there under a lease the runner keeps renewing until it acks or
+requeues it. Tasks whose lease lapsed (runner killed, pod evicted) are put
+back on the queue by the next runner that sweeps the list, and the retry
+resumes from the prompt's checkpoint.
+"""
+
+import os
+import json
+import time
+import shutil
+import signal
+import socket
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+from pipeline import run_pipeline
+from redis_client import get_redis
+from render import render_pool, available_cpus
+
+TASK_QUEUE = os.getenv("JOB_TASK_QUEUE", "job_task_queue")
+PROCESSING_QUEUE = os.getenv("JOB_TASK_PROCESSING_QUEUE", f"{TASK_QUEUE}:processing")
+# BLMOVE wakes up this often so the runner notices a shutdown request
+TASK_POP_TIMEOUT = int(os.getenv("TASK_POP_TIMEOUT", "5"))
+RUNNER_WORKDIR = os.getenv("RUNNER_WORKDIR", "/tmp/prompt2video")
+# A task whose lease is not renewed for this long is considered abandoned
+TASK_LEASE_SECONDS = int(os.getenv("TASK_LEASE_SECONDS", "60"))
+# Runs per task in total, matching the Job's backoff_limit=1
+JOB_TASK_ATTEMPTS = int(os.getenv("JOB_TASK_ATTEMPTS", "2"))
+
+_stopping = False
+
+
+def _request_stop(signum, frame):
+    global _stopping
+    print("Shutdown requested, finishing the current task...")
+    _stopping = True
+
+
+def _lease_key(payload: str) -> str:
+    return f"job_task_lease:{json.loads(payload)['id']}"
+
+
+class TaskLease:
+    """
+    Keeps a task's lease alive from a background thread while the pipeline
+    runs, so long renders are not mistaken for a dead runner.
+    """
+
+    def __init__(self, r, payload: str, owner: str):
+        self.r = r
+        self.key = _lease_key(payload)
+        self.owner = owner
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._renew, daemon=True)
+
+    def _renew(self):
+        while not self.stop.wait(TASK_LEASE_SECONDS / 3):
+            try:
+                self.r.set(self.key, self.owner, ex=TASK_LEASE_SECONDS)
+            except Exception as e:
+                print(f"Failed to renew task lease: {e}")
+
+    def __enter__(self):
+        self.r.set(self.key, self.owner, ex=TASK_LEASE_SECONDS)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+
+
+def ack(r, payload: str):
+    pipe = r.pipeline()
+    pipe.lrem(PROCESSING_QUEUE, 1, payload)
+    pipe.delete(_lease_key(payload))
+    pipe.execute()
+
+
+def _retry_or_drop(pipe, payload: str, reason, front: bool) -> bool:
+    # Counts the failed run and queues the task again while attempts remain
+    task = json.loads(payload)
+    attempts = task.get("attempts", 0) + 1
+    if attempts >= JOB_TASK_ATTEMPTS:
+        print(f"Task {task['id']} failed ({reason}) after {attempts} attempt(s), giving up")
+        return False
+    print(f"Task {task['id']} failed ({reason}), requeueing (attempt {attempts + 1}/{JOB_TASK_ATTEMPTS})")
+    retry = json.dumps({**task, "attempts": attempts})
+    # The runner pops from the right: front=True retries it next
+    if front:
+        pipe.rpush(TASK_QUEUE, retry)
+    else:
+        pipe.lpush(TASK_QUEUE, retry)
+    return True
+
+
+def requeue(r, payload: str, reason) -> bool:
+    """
+    Puts a failed task back on the queue while attempts remain, otherwise
+    drops it. Returns True when the task was requeued.
+    """
+    pipe = r.pipeline()
+    pipe.lrem(PROCESSING_QUEUE, 1, payload)
+    pipe.delete(_lease_key(payload))
+    retried = _retry_or_drop(pipe, payload, reason, front=False)
+    pipe.execute()
+    return retried
+
+
+class OrphanSweeper:
+    """
+    Requeues tasks left in the processing list without a lease. A task has
+    to be seen leaseless on two sweeps before it moves, so one a runner has
+    just taken but not yet leased is left alone.
+    """
+
+    def __init__(self, r):
+        self.r = r
+        self.suspects = set()
+        self.last_sweep = 0.0
+
+    def sweep(self):
+        if time.monotonic() - self.last_sweep < TASK_LEASE_SECONDS:
+            return
+        self.last_sweep = time.monotonic()
+        try:
+            payloads = self.r.lrange(PROCESSING_QUEUE, 0, -1)
+            leased = self.r.mget([_lease_key(payload) for payload in payloads]) if payloads else []
+        except Exception as e:
+            print(f"Error sweeping processing list: {e}")
+            return
+        orphans = {payload for payload, owner in zip(payloads, leased) if owner is None}
+        for payload in orphans & self.suspects:
+            # Only the runner whose LREM succeeds puts the task back. An abandoned
+            # run counts as an attempt, so a task that keeps killing its pod is dropped
+            if self.r.lrem(PROCESSING_QUEUE, 1, payload):
+                pipe = self.r.pipeline()
+                _retry_or_drop(pipe, payload, "runner lease lapsed", front=True)
+                pipe.execute()
+        self.suspects = orphans - self.suspects
+
+
+def run_task(task: dict, pool, workers: int):
+    prompt_id, prompt = task["id"], task["prompt"]
+    workdir = os.path.join(RUNNER_WORKDIR, prompt_id)
+    print(f"🔴 Running task {prompt_id}")
+    try:
+        run_pipeline(prompt_id, prompt, workdir=workdir, workers=workers, pool=pool)
+    finally:
+        # The checkpoint holds everything a retry needs; local files do not outlive the task
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    r = get_redis()
+    if r is None:
+        raise SystemExit("REDIS_URL is required in runner mode")
+
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+
+    owner = socket.gethostname()
+    sweeper = OrphanSweeper(r)
+    workers = available_cpus()
+    with render_pool(workers) as pool:
+        print(f"Runner ready with {workers} render worker(s). Waiting for tasks on '{TASK_QUEUE}'...")
+        while not _stopping:
+            sweeper.sweep()
+            try:
+                payload = r.blmove(TASK_QUEUE, PROCESSING_QUEUE, TASK_POP_TIMEOUT, "RIGHT", "LEFT")
+            except Exception as e:
+                print(f"Error reading task queue: {e}")
+                time.sleep(1)
+                continue
+            if not payload:
+                continue
+            try:
+                with TaskLease(r, payload, owner):
+                    run_task(json.loads(payload), pool, workers)
+            except BrokenProcessPool as e:
+                # A render child died and the pool cannot recover; requeue the
+                # task and exit so the pod restarts with a fresh pool
+                requeue(r, payload, f"render pool broken: {e}")
+                raise SystemExit(1)
+            except Exception as e:
+                requeue(r, payload, e)
+                continue
+            try:
+                ack(r, payload)
+            except Exception as e:
+                # Left to the sweeper; the rerun finds the final upload in the checkpoint
+                print(f"Failed to ack task: {e}")
+    print("Runner stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+
+SCENE_DIGEST_TOKEN_BUDGET = int(os.getenv("SCENE_DIGEST_TOKEN_BUDGET", "1200"))
+MAX_VISUAL_CHARS = 80
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting English prompts
+    return max(1, len(text) // 4)
+
+
+def _short(text, limit: int = MAX_VISUAL_CHARS) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[: limit - 3].rstrip() + "..."
+
+
+def chunk_digest(chunk: dict) -> dict:
+    """
+    Keeps only what the non-repetition rules need from a planned chunk:
+    its title, the core concept of each scene and the visual metaphors used.
+    """
+    concepts = []
+    visuals = []
+    for scene in chunk.get("scenes", []):
+        if scene.get("core_concept"):
+            concepts.append(_short(scene["core_concept"]))
+        elements = scene.get("visual_elements") or []
+        if isinstance(elements, str):
+            elements = [elements]
+        if not elements and scene.get("visual_plan"):
+            # First sentence of the plan carries the metaphor
+            elements = [str(scene["visual_plan"]).split(".")[0]]
+        visuals.extend(_short(e) for e in elements)
+    return {
+        "chunk_index": chunk.get("chunk_index"),
+        "chunk_title": chunk.get("chunk_title", ""),
+        "concepts": concepts,
+        "visuals": visuals,
+    }
+
+
+class SceneDigest:
+    """
+    Rolling summary of the chunks planned so far, rendered within a token
+    budget. When over budget, the oldest chunks lose their visuals first,
+    then their concepts; chunk titles are always kept.
+    """
+
+    def __init__(self, chunks: list | None = None, token_budget: int = SCENE_DIGEST_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.entries = [chunk_digest(c) for c in (chunks or [])]
+
+    def add(self, chunk: dict):
+        self.entries.append(chunk_digest(chunk))
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _render_entry(i: int, entry: dict, detail: int) -> str:
+        index = entry["chunk_index"] or i + 1
+        lines = [f"Chunk {index}: {entry['chunk_title']}"]
+        if detail >= 1 and entry["concepts"]:
+            lines.append("  concepts: " + "; ".join(entry["concepts"]))
+        if detail >= 2 and entry["visuals"]:
+            lines.append("  visuals: " + "; ".join(entry["visuals"]))
+        return "\n".join(lines)
+
+    def render(self) -> str:
+        if not self.entries:
+            return "EMPTY"
+
+        # 2 = title + concepts + visuals, 1 = title + concepts, 0 = title only
+        details = [2] * len(self.entries)
+        for target in (1, 0):
+            for i in range(len(self.entries)):
+                text = self._text(details)
+                if estimate_tokens(text) <= self.token_budget:
+                    return text
+                details[i] = min(details[i], target)
+        return self._text(details)
+
+    def _text(self, details: list) -> str:
+        return "\n".join(self._render_entry(i, e, d) for i, (e, d) in enumerate(zip(self.entries, details)))
@@ -0,0 +1,225 @@
+"""Scene-level fan-out: the planning pod submits one render task per scene to
+a Redis queue, render pods (scene_worker.py) render and upload the clips,
+and SceneReducer collects them in manifest order.
+
+SceneTaskBoard, pop_scene_task and scene_worker.main take the Redis client
+as an argument, so the flow can run locally against
+fakeredis.FakeRedis(decode_responses=True) with several workers.
+"""
+
+import os
+import json
+import time
+import shutil
+from urllib.parse import urlparse
+
+import requests
+
+from redis_client import get_redis
+from render import scene_sort_key
+
+SCENE_TASK_QUEUE = os.getenv("SCENE_TASK_QUEUE", "scene_task_queue")
+# A scene whose render fails or whose pod disappears is submitted again, up to this many times in total
+SCENE_TASK_ATTEMPTS = int(os.getenv("SCENE_TASK_ATTEMPTS", "2"))
+# No result this long after a render pod started the scene counts as a straggler and is submitted again
+SCENE_STRAGGLER_TIMEOUT = float(os.getenv("SCENE_STRAGGLER_TIMEOUT", "900"))
+# Once every scene is submitted, the reducer gives up on missing scenes after this long
+SCENE_REDUCE_TIMEOUT = float(os.getenv("SCENE_REDUCE_TIMEOUT", "3600"))
+SCENE_POLL_SECONDS = float(os.getenv("SCENE_POLL_SECONDS", "2"))
+SCENE_TASK_TTL = int(os.getenv("SCENE_TASK_TTL", str(24 * 3600)))
+
+
+class SceneTaskBoard:
+    """
+    Redis state for one prompt's scene tasks: what was dispatched (script,
+    attempt, time), when a render pod started each attempt and the first
+    final result reported for each scene.
+    """
+
+    def __init__(self, prompt_id: str, client=None, queue_name: str = SCENE_TASK_QUEUE, ttl: int = SCENE_TASK_TTL):
+        self.prompt_id = prompt_id
+        self.client = client or get_redis()
+        if self.client is None:
+            raise RuntimeError("Scene fan-out needs Redis but REDIS_URL is not set")
+        self.queue_name = queue_name
+        self.ttl = ttl
+
+    def _key(self, name: str) -> str:
+        return f"scene_tasks:{self.prompt_id}:{name}"
+
+    def submit(self, scene_id: str, script: str, attempt: int = 0):
+        task = {"prompt_id": self.prompt_id, "scene_id": scene_id, "script": script, "attempt": attempt}
+        dispatched = {"script": script, "attempt": attempt, "at": time.time()}
+        pipe = self.client.pipeline()
+        pipe.hset(self._key("dispatched"), scene_id, json.dumps(dispatched))
+        pipe.expire(self._key("dispatched"), self.ttl)
+        # Render pods pop with BRPOP, so LPUSH keeps the queue FIFO
+        pipe.lpush(self.queue_name, json.dumps(task))
+        pipe.execute()
+
+    def report(self, scene_id: str, result: dict) -> bool:
+        """
+        Records a scene's final result. Only the first report wins, so a
+        straggler finishing after its retry cannot overwrite it.
+        """
+        pipe = self.client.pipeline()
+        pipe.hsetnx(self._key("results"), scene_id, json.dumps(result))
+        pipe.expire(self._key("results"), self.ttl)
+        stored, _ = pipe.execute()
+        return bool(stored)
+
+    def mark_started(self, scene_id: str, attempt: int):
+        """
+        Called by a render pod when it picks a task up; stragglers are timed
+        from here, not from when the task was queued.
+        """
+        pipe = self.client.pipeline()
+        pipe.hset(self._key("started"), scene_id, json.dumps({"attempt": attempt, "at": time.time()}))
+        pipe.expire(self._key("started"), self.ttl)
+        pipe.execute()
+
+    def started(self) -> dict:
+        raw = self.client.hgetall(self._key("started"))
+        return {scene_id: json.loads(value) for scene_id, value in raw.items()}
+
+    def dispatched(self) -> dict:
+        raw = self.client.hgetall(self._key("dispatched"))
+        return {scene_id: json.loads(value) for scene_id, value in raw.items()}
+
+    def results(self) -> dict:
+        raw = self.client.hgetall(self._key("results"))
+        return {scene_id: json.loads(value) for scene_id, value in raw.items()}
+
+
+def pop_scene_task(client, timeout: int, queue_name: str = SCENE_TASK_QUEUE) -> dict | None:
+    result = client.brpop(queue_name, timeout=timeout)
+    if not result:
+        return None
+    _, payload = result
+    return json.loads(payload)
+
+
+def retry_or_fail(board: SceneTaskBoard, task: dict, result: dict):
+    """
+    Called by a render pod when a scene did not render: submits it again while
+    attempts remain, otherwise reports the failure.
+    """
+    attempt = task.get("attempt", 0) + 1
+    if attempt < SCENE_TASK_ATTEMPTS:
+        print(f"[{task['scene_id']}] Scene task failed, retrying (attempt {attempt + 1}/{SCENE_TASK_ATTEMPTS})")
+        board.submit(task["scene_id"], task["script"], attempt)
+    else:
+        board.report(task["scene_id"], result)
+
+
+def fetch_clip(url: str, dest: str) -> str:
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    tmp_path = f"{dest}.tmp"
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        shutil.copyfile(parsed.path, tmp_path)
+    else:
+        with requests.get(url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                for block in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(block)
+    os.replace(tmp_path, dest)
+    return dest
+
+
+class SceneReducer:
+    """
+    Collects a prompt's scene results as render pods report them, downloads
+    each rendered clip into video_dir and hands it to on_clip/on_skip.
+    Stragglers are submitted again; scenes still missing when the deadline
+    passes are recorded as timed out.
+    """
+
+    def __init__(self, board: SceneTaskBoard, video_dir: str, on_clip=None, on_skip=None,
+                 straggler_timeout: float = SCENE_STRAGGLER_TIMEOUT, reduce_timeout: float = SCENE_REDUCE_TIMEOUT):
+        self.board = board
+        self.video_dir = video_dir
+        self.on_clip = on_clip
+        self.on_skip = on_skip
+        self.straggler_timeout = straggler_timeout
+        self.reduce_timeout = reduce_timeout
+        self.collected = {}
+        self.deadline = None
+
+    def submit(self, scene_id: str, script: str):
+        # A retried Job reuses results its scenes already reported
+        if scene_id not in self.board.results():
+            self.board.submit(scene_id, script)
+
+    def close(self):
+        """
+        Called once every scene has been submitted; starts the reduce deadline.
+        """
+        self.deadline = time.monotonic() + self.reduce_timeout
+
+    def _collect(self, scene_id: str, result: dict):
+        entry = {
+            "scene_id": scene_id,
+            "status": result.get("status", "failed"),
+            "attempts": result.get("attempts", 0),
+            "video_path": None,
+            "error": result.get("error"),
+            "seconds": result.get("seconds", 0.0),
+            "validate_seconds": result.get("validate_seconds", 0.0),
+            "cache": result.get("cache", "miss"),
+        }
+        if entry["status"] == "rendered" and result.get("url"):
+            try:
+                entry["video_path"] = fetch_clip(result["url"], os.path.join(self.video_dir, scene_id, f"{scene_id}.mp4"))
+                if result.get("codec"):
+                    entry["codec"] = result["codec"]
+                    entry["duration"] = result.get("duration")
+            except Exception as e:
+                print(f"[{scene_id}] Could not download clip: {e}")
+                entry["status"] = "failed"
+                entry["error"] = str(e)
+        self.collected[scene_id] = entry
+        if entry["video_path"] and self.on_clip:
+            self.on_clip(scene_id, entry["video_path"])
+        elif not entry["video_path"] and self.on_skip:
+            self.on_skip(scene_id)
+
+    def poll(self):
+        results = self.board.results()
+        started = self.board.started()
+        now = time.time()
+        for scene_id, dispatched in self.board.dispatched().items():
+            if scene_id in results:
+                continue
+            # A scene still waiting in the queue is not a straggler; the reduce deadline covers it
+            began = started.get(scene_id)
+            if not began or began["attempt"] != dispatched["attempt"] or now - began["at"] < self.straggler_timeout:
+                continue
+            attempt = dispatched["attempt"] + 1
+            if attempt < SCENE_TASK_ATTEMPTS:
+                print(f"[{scene_id}] No result {self.straggler_timeout:.0f}s after it started, submitting again")
+                self.board.submit(scene_id, dispatched["script"], attempt)
+            else:
+                self.board.report(scene_id, {"status": "failed", "attempts": attempt, "error": "timed out"})
+
+        for scene_id, result in self.board.results().items():
+            if scene_id not in self.collected:
+                self._collect(scene_id, result)
+
+    def done(self) -> bool:
+        if self.deadline is None:
+            return False
+        pending = set(self.board.dispatched()) - set(self.collected)
+        if not pending:
+            return True
+        if time.monotonic() < self.deadline:
+            return False
+        for scene_id in sorted(pending, key=scene_sort_key):
+            print(f"[{scene_id}] Gave up waiting for the scene")
+            self.board.report(scene_id, {"status": "failed", "error": "timed out"})
+        self.poll()
+        return True
+
+    def manifest(self) -> list:
+        return sorted(self.collected.values(), key=lambda item: scene_sort_key(item["scene_id"]))
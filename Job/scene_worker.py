@@ -0,0 +1,101 @@
+"""Render pod for scene fan-out: pops scene tasks from Redis, renders each one
+in a warm render pool, uploads the clip and reports the result.
+"""
+
+import os
+import shutil
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from redis_client import get_redis
+from render import render_pool, render_scene, crashed_result, available_cpus
+from scene_tasks import SceneTaskBoard, pop_scene_task, retry_or_fail
+from storage import get_storage, scene_clip_key
+
+# BRPOP wakes up this often so the worker notices a shutdown request
+TASK_POP_TIMEOUT = int(os.getenv("TASK_POP_TIMEOUT", "5"))
+RUNNER_WORKDIR = os.getenv("RUNNER_WORKDIR", "/tmp/prompt2video")
+
+_stopping = threading.Event()
+# Set when a render child died and took the pool with it
+_pool_broken = threading.Event()
+
+
+def _request_stop(signum, frame):
+    print("Shutdown requested, finishing in-flight scenes...")
+    _stopping.set()
+
+
+def run_scene_task(task: dict, client, pool):
+    prompt_id, scene_id = task["prompt_id"], task["scene_id"]
+    board = SceneTaskBoard(prompt_id, client)
+    workdir = os.path.join(RUNNER_WORKDIR, "scenes", prompt_id, scene_id)
+    file_path = os.path.join(workdir, "code", f"{scene_id}.py")
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w") as f:
+        f.write(task["script"])
+
+    try:
+        board.mark_started(scene_id, task.get("attempt", 0))
+        try:
+            result = pool.submit(render_scene, file_path, os.path.join(workdir, "video"), prompt_id=prompt_id).result()
+        except BrokenProcessPool as e:
+            # Every later scene would fail instantly on this pod; stop taking
+            # tasks and exit so it restarts with a fresh pool
+            print(f"[{scene_id}] Render pool is broken, stopping the worker")
+            _pool_broken.set()
+            _stopping.set()
+            result = crashed_result(file_path, e)
+        except Exception as e:
+            result = crashed_result(file_path, e)
+        if result["status"] == "rendered" and result["video_path"]:
+            result["url"] = get_storage().put_file(result["video_path"], scene_clip_key(prompt_id, scene_id), "video/mp4")
+            result["video_path"] = None
+            board.report(scene_id, result)
+            print(f"[{scene_id}] Reported clip for {prompt_id}")
+        else:
+            retry_or_fail(board, task, result)
+    except Exception as e:
+        print(f"[{scene_id}] Scene task failed: {e}")
+        retry_or_fail(board, task, crashed_result(file_path, e))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(client=None):
+    client = client or get_redis()
+    if client is None:
+        raise SystemExit("REDIS_URL is required for scene workers")
+
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _request_stop)
+        signal.signal(signal.SIGINT, _request_stop)
+
+    workers = available_cpus()
+    # Only pop a task when a render worker is free, so queued scenes stay
+    # available to other pods
+    free = threading.BoundedSemaphore(workers)
+    with render_pool(workers) as pool, ThreadPoolExecutor(max_workers=workers) as handlers:
+        print(f"Scene worker ready with {workers} render worker(s).")
+        while not _stopping.is_set():
+            if not free.acquire(timeout=TASK_POP_TIMEOUT):
+                continue
+            try:
+                task = pop_scene_task(client, TASK_POP_TIMEOUT)
+            except Exception as e:
+                print(f"Error reading scene queue: {e}")
+                task = None
+            if task is None:
+                free.release()
+                continue
+            future = handlers.submit(run_scene_task, task, client, pool)
+            future.add_done_callback(lambda _: free.release())
+    if _pool_broken.is_set():
+        raise SystemExit(1)
+    print("Scene worker stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import cloudinary
+import cloudinary.uploader
+import cloudinary.utils
+
+import metrics
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary")  # cloudinary | local
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", os.path.join(".storage"))
+LOCAL_STORAGE_BASE_URL = os.getenv("LOCAL_STORAGE_BASE_URL")
+CLOUDINARY_FOLDER = "prompt2video"
+# Files above one chunk are uploaded as parts, several at a time, and a
+# failed upload resumes from the parts that already made it.
+STORAGE_CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", str(20 * 1024 * 1024)))
+STORAGE_UPLOAD_CONCURRENCY = int(os.getenv("STORAGE_UPLOAD_CONCURRENCY", "4"))
+STORAGE_UPLOAD_RETRIES = int(os.getenv("STORAGE_UPLOAD_RETRIES", "5"))
+
+
+class ChunkedStorage(ABC):
+    """
+    Base for storage backends. put_file splits large files into parts, sends
+    all but the last part in parallel and the last one once they are done.
+    Completed parts are recorded next to the file in <file>.upload.json, so a
+    retried upload of the same unchanged file skips them.
+    """
+
+    chunk_size = STORAGE_CHUNK_SIZE
+    concurrency = STORAGE_UPLOAD_CONCURRENCY
+    retries = STORAGE_UPLOAD_RETRIES
+
+    def __init__(self):
+        self.last_upload = None
+
+    # Backends implement these
+    @abstractmethod
+    def _start_upload(self, local_path: str, key: str, size: int) -> str:
+        ...
+
+    @abstractmethod
+    def _upload_part(self, upload_id: str, local_path: str, key: str, start: int, data: bytes, size: int, is_last: bool):
+        ...
+
+    @abstractmethod
+    def _put_small(self, local_path: str, key: str) -> str:
+        ...
+
+    @abstractmethod
+    def url_for_result(self, result, key: str) -> str:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @staticmethod
+    def _state_path(local_path: str) -> str:
+        return f"{local_path}.upload.json"
+
+    def _load_state(self, local_path: str, key: str, size: int, mtime: float):
+        try:
+            with open(self._state_path(local_path), "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("key") != key or state.get("size") != size or state.get("mtime") != mtime:
+            return None
+        if state.get("chunk_size") != self.chunk_size:
+            return None
+        return state
+
+    def _save_state(self, local_path: str, state: dict):
+        tmp_path = f"{self._state_path(local_path)}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._state_path(local_path))
+
+    def _with_retries(self, fn, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return fn(*args)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = min(30, 2 ** attempt)
+                print(f"Upload part failed ({e}), retrying in {delay}s...")
+                time.sleep(delay)
+
+    def put_file(self, local_path: str, key: str, content_type: str | None = None) -> str:
+        size = os.path.getsize(local_path)
+        started = time.perf_counter()
+
+        if size <= self.chunk_size:
+            url = self._with_retries(self._put_small, local_path, key)
+            self._record(local_path, size, started, parts=1, resumed=0)
+            return url
+
+        mtime = os.path.getmtime(local_path)
+        state = self._load_state(local_path, key, size, mtime)
+        if state is None:
+            state = {
+                "key": key,
+                "size": size,
+                "mtime": mtime,
+                "chunk_size": self.chunk_size,
+                "upload_id": self._start_upload(local_path, key, size),
+                "done": [],
+            }
+            self._save_state(local_path, state)
+        resumed = len(state["done"])
+        if resumed:
+            print(f"Resuming upload of {local_path}: {resumed} part(s) already uploaded")
+
+        offsets = list(range(0, size, self.chunk_size))
+        last_offset = offsets[-1]
+        lock = threading.Lock()
+
+        def send(start: int):
+            with open(local_path, "rb") as f:
+                f.seek(start)
+                data = f.read(self.chunk_size)
+            result = self._with_retries(
+                self._upload_part, state["upload_id"], local_path, key, start, data, size, start == last_offset
+            )
+            if start != last_offset:
+                with lock:
+                    state["done"].append(start)
+                    self._save_state(local_path, state)
+            return result
+
+        pending = [start for start in offsets[:-1] if start not in state["done"]]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            list(pool.map(send, pending))
+        # The final part completes the upload, so it only goes once every other part is in
+        result = send(last_offset)
+
+        os.remove(self._state_path(local_path))
+        self._record(local_path, size, started, parts=len(offsets), resumed=resumed)
+        return self.url_for_result(result, key)
+
+    def _record(self, local_path: str, size: int, started: float, parts: int, resumed: int):
+        seconds = max(time.perf_counter() - started, 1e-6)
+        self.last_upload = {
+            "path": local_path,
+            "bytes": size,
+            "seconds": seconds,
+            "bytes_per_sec": size / seconds,
+            "parts": parts,
+            "resumed_parts": resumed,
+        }
+        metrics.observe("upload_seconds", seconds)
+        metrics.observe("upload_mbps", size * 8 / seconds / 1e6)
+        print(f"Uploaded {local_path}: {size / 1e6:.1f} MB in {seconds:.2f}s ({size * 8 / seconds / 1e6:.1f} Mbit/s, {parts} part(s))")
+
+
+class LocalStorage(ChunkedStorage):
+    """
+    Publishes files into a local directory. Used for tests and benchmarks;
+    URLs are file:// paths unless LOCAL_STORAGE_BASE_URL points at a server.
+    """
+
+    def __init__(self, root: str = LOCAL_STORAGE_DIR, base_url: str | None = LOCAL_STORAGE_BASE_URL):
+        super().__init__()
+        self.root = root
+        self.base_url = base_url
+        os.makedirs(root, exist_ok=True)
+
+    def url_for(self, key: str) -> str:
+        if self.base_url:
+            return f"{self.base_url.rstrip('/')}/{key}"
+        return "file://" + os.path.abspath(os.path.join(self.root, key))
+
+    def _dest(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _put_small(self, local_path: str, key: str) -> str:
+        dest = self._dest(key)
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        tmp_path = f"{dest}.tmp"
+        shutil.copyfile(local_path, tmp_path)
+        os.replace(tmp_path, dest)
+        return self.url_for(key)
+
+    def _start_upload(self, local_path: str, key: str, size: int) -> str:
+        dest = self._dest(key)
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        with open(f"{dest}.part", "wb") as f:
+            f.truncate(size)
+        return f"{dest}.part"
+
+    def _upload_part(self, upload_id: str, local_path: str, key: str, start: int, data: bytes, size: int, is_last: bool):
+        fd = os.open(upload_id, os.O_WRONLY)
+        try:
+            os.pwrite(fd, data, start)
+        finally:
+            os.close(fd)
+        if is_last:
+            os.replace(upload_id, self._dest(key))
+
+    def url_for_result(self, result, key: str) -> str:
+        return self.url_for(key)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._dest(key))
+        except FileNotFoundError:
+            pass
+
+
+class CloudinaryStorage(ChunkedStorage):
+    """
+    Publishes files to Cloudinary under CLOUDINARY_FOLDER. Large files use
+    Cloudinary's chunked upload protocol (Content-Range parts sharing an
+    X-Unique-Upload-Id). Playlists and segments are stored as raw resources
+    so their names are kept as-is.
+    """
+
+    def __init__(self, folder: str = CLOUDINARY_FOLDER):
+        super().__init__()
+        self.folder = folder
+
+    def _options(self, key: str) -> dict:
+        resource_type = "video" if key.endswith(".mp4") else "raw"
+        public_id = f"{self.folder}/{key}"
+        if resource_type == "video":
+            public_id = os.path.splitext(public_id)[0]
+        return {"public_id": public_id, "resource_type": resource_type, "overwrite": True, "invalidate": True}
+
+    def _put_small(self, local_path: str, key: str) -> str:
+        result = cloudinary.uploader.upload(local_path, **self._options(key))
+        return result.get("secure_url")
+
+    def _start_upload(self, local_path: str, key: str, size: int) -> str:
+        return cloudinary.utils.random_public_id()
+
+    def _upload_part(self, upload_id: str, local_path: str, key: str, start: int, data: bytes, size: int, is_last: bool):
+        content_range = f"bytes {start}-{start + len(data) - 1}/{size}"
+        return cloudinary.uploader.upload_large_part(
+            (os.path.basename(local_path), data),
+            http_headers={"Content-Range": content_range, "X-Unique-Upload-Id": upload_id},
+            **self._options(key),
+        )
+
+    def url_for_result(self, result, key: str) -> str:
+        return result.get("secure_url")
+
+    def delete(self, key: str):
+        options = self._options(key)
+        cloudinary.uploader.destroy(options["public_id"], resource_type=options["resource_type"], invalidate=True)
+
+
+def scene_clip_key(prompt_id: str, scene_id: str) -> str:
+    # Scene clips uploaded by the pipeline's checkpoint and by scene workers;
+    # deleted once the final video is published
+    return f"scenes/{prompt_id}/{scene_id}.mp4"
+
+
+_storage = None
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        _storage = LocalStorage() if STORAGE_BACKEND.lower() == "local" else CloudinaryStorage()
+    return _storage
@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# llm.py exports GEMINI_API_KEY at import time; keep litellm from fetching its cost map
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
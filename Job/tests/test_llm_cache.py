@@ -0,0 +1,48 @@
+import fakeredis
+
+from llm_cache import RedisCache
+
+
+def make_cache(max_bytes):
+    return RedisCache(fakeredis.FakeRedis(decode_responses=True), ttl=60, max_bytes=max_bytes, prefix="test_llm_cache")
+
+
+def test_running_total_tracks_writes_and_overwrites():
+    cache = make_cache(max_bytes=100)
+    cache.set("a", "x" * 10)
+    cache.set("b", "x" * 20)
+    cache.set("a", "x" * 5)
+    assert cache._total() == 25
+    assert cache.get("a") == "x" * 5
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = make_cache(max_bytes=25)
+    cache.set("a", "x" * 10)
+    cache.set("b", "x" * 10)
+    cache.get("a")
+    cache.set("c", "x" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 10
+    assert cache.get("c") == "x" * 10
+    assert cache._total() == 20
+
+
+def test_expired_entries_are_pruned_before_evicting():
+    cache = make_cache(max_bytes=25)
+    cache.set("a", "x" * 10)
+    cache.set("b", "x" * 10)
+    # "a" expired by TTL but its records remain
+    cache.client.delete(cache._key("a"))
+    cache.set("c", "x" * 10)
+    assert cache.get("b") == "x" * 10
+    assert cache.get("c") == "x" * 10
+    assert cache.client.zscore(cache.lru_key, "a") is None
+    assert cache.client.hget(cache.sizes_key, "a") is None
+    assert cache._total() == 20
+
+
+def test_total_is_seeded_from_existing_sizes():
+    cache = make_cache(max_bytes=100)
+    cache.client.hset(cache.sizes_key, mapping={"a": 10, "b": 15})
+    assert cache._total() == 25
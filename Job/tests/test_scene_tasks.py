@@ -0,0 +1,84 @@
+import time
+
+import fakeredis
+
+from scene_tasks import SceneTaskBoard, SceneReducer, pop_scene_task, retry_or_fail
+
+QUEUE = "test_scene_task_queue"
+
+
+def make_board():
+    return SceneTaskBoard("prompt-1", client=fakeredis.FakeRedis(decode_responses=True), queue_name=QUEUE)
+
+
+def reduce(reducer, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        reducer.poll()
+        if reducer.done():
+            return reducer.manifest()
+        assert time.monotonic() < deadline, "reducer did not finish"
+        time.sleep(0.01)
+
+
+def test_worker_results_are_reduced_into_an_ordered_manifest(tmp_path):
+    board = make_board()
+    clips, skipped = [], []
+    reducer = SceneReducer(board, str(tmp_path / "video"), on_clip=lambda scene_id, path: clips.append(scene_id),
+                           on_skip=skipped.append, reduce_timeout=0.2)
+    for scene_id in ("chunk_2_scene_1", "chunk_1_scene_10", "chunk_1_scene_2", "chunk_1_scene_1"):
+        reducer.submit(scene_id, f"# {scene_id}")
+    reducer.close()
+
+    # One render pod works through the queue in submission order
+    seen = []
+    while (task := pop_scene_task(board.client, timeout=1, queue_name=QUEUE)) is not None:
+        scene_id = task["scene_id"]
+        seen.append(scene_id)
+        board.mark_started(scene_id, task["attempt"])
+        if scene_id == "chunk_1_scene_10":
+            # The pod dies mid-render and never reports
+            continue
+        if scene_id == "chunk_2_scene_1":
+            board.report(scene_id, {"status": "failed", "attempts": 2, "error": "render failed"})
+            continue
+        clip = tmp_path / "uploads" / f"{scene_id}.mp4"
+        clip.parent.mkdir(exist_ok=True)
+        clip.write_bytes(scene_id.encode())
+        board.report(scene_id, {"status": "rendered", "attempts": 1, "url": clip.as_uri()})
+    assert seen == ["chunk_2_scene_1", "chunk_1_scene_10", "chunk_1_scene_2", "chunk_1_scene_1"]
+
+    manifest = reduce(reducer)
+
+    assert [entry["scene_id"] for entry in manifest] == [
+        "chunk_1_scene_1", "chunk_1_scene_2", "chunk_1_scene_10", "chunk_2_scene_1",
+    ]
+    by_id = {entry["scene_id"]: entry for entry in manifest}
+    for scene_id in ("chunk_1_scene_1", "chunk_1_scene_2"):
+        assert by_id[scene_id]["status"] == "rendered"
+        with open(by_id[scene_id]["video_path"], "rb") as f:
+            assert f.read() == scene_id.encode()
+    assert by_id["chunk_2_scene_1"]["status"] == "failed"
+    assert by_id["chunk_2_scene_1"]["error"] == "render failed"
+    assert by_id["chunk_1_scene_10"]["status"] == "failed"
+    assert by_id["chunk_1_scene_10"]["error"] == "timed out"
+    assert by_id["chunk_1_scene_10"]["video_path"] is None
+    assert sorted(clips) == ["chunk_1_scene_1", "chunk_1_scene_2"]
+    assert sorted(skipped) == ["chunk_1_scene_10", "chunk_2_scene_1"]
+
+
+def test_failed_scene_is_retried_then_reported():
+    board = make_board()
+    board.submit("chunk_1_scene_1", "# scene")
+    failure = {"status": "failed", "attempts": 1, "error": "boom"}
+
+    task = pop_scene_task(board.client, timeout=1, queue_name=QUEUE)
+    retry_or_fail(board, task, failure)
+    assert board.results() == {}
+    retry = pop_scene_task(board.client, timeout=1, queue_name=QUEUE)
+    assert retry["attempt"] == 1
+    assert board.dispatched()["chunk_1_scene_1"]["attempt"] == 1
+
+    retry_or_fail(board, retry, failure)
+    assert board.results() == {"chunk_1_scene_1": failure}
+    assert pop_scene_task(board.client, timeout=1, queue_name=QUEUE) is None
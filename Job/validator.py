@@ -0,0 +1,86 @@
+import ast
+
+from prompt import ALLOWED_MOBJECTS, ALLOWED_ANIMATIONS, ALLOWED_MODULES, BANNED_NAMES, BANNED_MODULES
+
+ALLOWED_CALLS = ALLOWED_MOBJECTS | ALLOWED_ANIMATIONS
+
+
+def _base_name(node: ast.expr) -> str | None:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def _local_names(tree: ast.Module) -> set:
+    # Classes, functions and names imported from non-manim modules are the
+    # script's own and are not subject to the mobject/animation whitelist.
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.ImportFrom) and (node.module or "").split(".")[0] != "manim":
+            names.update(alias.asname or alias.name for alias in node.names)
+        elif isinstance(node, ast.Import):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+    return names
+
+
+def validate_script(source: str):
+    """
+    Statically checks a generated Manim script without importing Manim.
+    Returns (scene_class_name, errors); errors is empty when the script may be rendered.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as e:
+        return None, [f"SyntaxError: {e.msg} (line {e.lineno}): {(e.text or '').strip()}"]
+
+    errors = []
+
+    scene_classes = [
+        node.name
+        for node in tree.body
+        if isinstance(node, ast.ClassDef)
+        and any((_base_name(base) or "").endswith("Scene") for base in node.bases)
+    ]
+    if not scene_classes:
+        errors.append("No Scene subclass found. Define exactly one class inheriting from Scene.")
+    elif len(scene_classes) > 1:
+        errors.append(f"Found {len(scene_classes)} Scene subclasses ({', '.join(scene_classes)}). Define exactly one.")
+
+    local_names = _local_names(tree)
+    for node in ast.walk(tree):
+        line = getattr(node, "lineno", "?")
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                module = alias.name.split(".")[0]
+                if module in BANNED_MODULES or module not in ALLOWED_MODULES:
+                    errors.append(f"Line {line}: import of '{alias.name}' is not allowed.")
+        elif isinstance(node, ast.ImportFrom):
+            module = (node.module or "").split(".")[0]
+            if module in BANNED_MODULES or module not in ALLOWED_MODULES:
+                errors.append(f"Line {line}: import from '{node.module}' is not allowed.")
+        elif isinstance(node, (ast.Name, ast.Attribute)):
+            name = _base_name(node)
+            if name in BANNED_NAMES:
+                errors.append(f"Line {line}: '{name}' is not allowed (no external assets).")
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            name = node.func.id
+            # Manim mobjects and animations are CapWords classes
+            if (
+                name[:1].isupper()
+                and not name.isupper()
+                and name not in ALLOWED_CALLS
+                and name not in BANNED_NAMES
+                and name not in local_names
+            ):
+                errors.append(f"Line {line}: '{name}' is not in the allowed mobject/animation list.")
+
+    scene_class = scene_classes[0] if len(scene_classes) == 1 else None
+    return scene_class, errors
+
+
+def format_errors(errors: list) -> str:
+    return "Static validation failed before rendering:\n" + "\n".join(f"- {e}" for e in errors)
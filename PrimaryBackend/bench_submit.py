@@ -0,0 +1,64 @@
+"""Compares prompt submission throughput of POST /c/prompt and POST /c/prompts.
+
+    python bench_submit.py --url http://localhost:8000 --count 500 --concurrency 16 --batch 100
+
+Every submitted prompt is a real document and queue entry, so point it at a
+scratch database and a Redis without workers attached.
+"""
+
+import json
+import time
+import uuid
+import argparse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def post(url: str, body) -> dict:
+    request = urllib.request.Request(
+        url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"}, method="POST"
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def make_prompts(count: int) -> list[str]:
+    # Unique texts so deduplication does not short-circuit the single endpoint
+    run = uuid.uuid4().hex[:8]
+    return [f"benchmark {run} prompt {i}" for i in range(count)]
+
+
+def bench_single(base_url: str, prompts: list[str], concurrency: int) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda text: post(f"{base_url}/c/prompt", {"prompt": text, "reuse": False}), prompts))
+    return time.perf_counter() - started
+
+
+def bench_batch(base_url: str, prompts: list[str], concurrency: int, batch: int) -> float:
+    batches = [prompts[i:i + batch] for i in range(0, len(prompts), batch)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda chunk: post(f"{base_url}/c/prompts", {"prompts": chunk}), batches))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args()
+
+    single = bench_single(args.url, make_prompts(args.count), args.concurrency)
+    batched = bench_batch(args.url, make_prompts(args.count), args.concurrency, args.batch)
+
+    print(f"{'endpoint':<12} {'seconds':>8} {'prompts/s':>10}")
+    print(f"{'/c/prompt':<12} {single:>8.2f} {args.count / single:>10.1f}")
+    print(f"{'/c/prompts':<12} {batched:>8.2f} {args.count / batched:>10.1f}")
+    print(f"speedup: {single / batched:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 from pydantic import BaseModel, EmailStr, Field
 from beanie import Indexed, PydanticObjectId
 from beanie import Document, Indexed, init_beanie,Link, PydanticObjectId
+from beanie import before_event, Insert, Replace, Save, SaveChanges, Update
+from pymongo import IndexModel, ASCENDING, DESCENDING
 from enum import Enum
 from datetime import datetime
 
@@ -9,6 +11,15 @@ class VideoStatus(str, Enum):
     COMPLETED = "completed"
     FAILED = "failed"
 
+class StageRecord(BaseModel):
+    stage: str
+    status: str
+    started_at: datetime | None = None
+    ended_at: datetime | None = None
+    seconds: float | None = None
+    detail: dict = Field(default_factory=dict)
+
+
 class User(Document):
     name: str
     email: EmailStr
@@ -19,16 +30,74 @@ class User(Document):
     class Settings:
         name = "users"
 
+    @before_event(Insert, Replace, Save, SaveChanges, Update)
+    def touch(self):
+        self.updatedAt = datetime.utcnow()
+
 
 class Prompt(Document):
     # user: Link[User]
     prompt: str
+    # sha256 of the normalized prompt text, used to find repeats of a topic
+    prompt_hash: str | None = None
     ai_generated_prompt: str | None = None
+    # Plan chunks are appended with $push; ai_generated_prompt only holds legacy data
+    ai_generated_chunks: list[str] = Field(default_factory=list)
     cloudinary_url: str | None = None
+    playlist_url: str | None = None
     video_status: VideoStatus = VideoStatus.PENDING
+    # Finished pipeline stages with timings, appended by the stage event consumer
+    stage_events: list[StageRecord] = Field(default_factory=list)
     createdAt: datetime = Field(default_factory=datetime.utcnow)
     updatedAt: datetime = Field(default_factory=datetime.utcnow)
 
     class Settings:
         name = "prompts"
+        # Listing sorts newest first with _id as tie-breaker for keyset paging
+        indexes = [
+            IndexModel([("createdAt", DESCENDING), ("_id", DESCENDING)], name="created_desc"),
+            IndexModel(
+                [("video_status", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+                name="status_created_desc",
+            ),
+            # Exact-repeat lookup: newest prompt with a given normalized-text hash
+            IndexModel([("prompt_hash", ASCENDING), ("createdAt", DESCENDING)], name="prompt_hash_created_desc"),
+        ]
+
+    @before_event(Insert, Replace, Save, SaveChanges, Update)
+    def touch(self):
+        # Raw collection updates have to $set updatedAt themselves
+        self.updatedAt = datetime.utcnow()
+
+    def full_ai_generated_prompt(self) -> str | None:
+        return join_ai_generated_prompt(self.ai_generated_prompt, self.ai_generated_chunks)
+
+
+def join_ai_generated_prompt(legacy: str | None, chunks: list[str]) -> str | None:
+    parts = ([legacy] if legacy else []) + chunks
+    return "\n".join(parts) if parts else None
+
+
+# Projections for the read endpoints, so they skip the rest of the document
+class PromptPlanView(BaseModel):
+    ai_generated_prompt: str | None = None
+    ai_generated_chunks: list[str] = Field(default_factory=list)
+
+
+class PromptVideoView(BaseModel):
+    cloudinary_url: str | None = None
+
+
+class PromptStagesView(BaseModel):
+    video_status: VideoStatus
+    stage_events: list[StageRecord] = Field(default_factory=list)
+
+
+class PromptListItem(BaseModel):
+    id: PydanticObjectId = Field(alias="_id")
+    prompt: str
+    video_status: VideoStatus
+    cloudinary_url: str | None = None
+    createdAt: datetime
+    updatedAt: datetime
 
@@ -2,6 +2,12 @@ from pydantic import BaseModel
 
 class PromptRequest(BaseModel):
     prompt: str
+    # Set to false to always start a new job instead of reusing a matching prompt
+    reuse: bool = True
+
+
+class BatchPromptRequest(BaseModel):
+    prompts: list[str]
 
 
 class VideoRequest(BaseModel):
@@ -9,6 +15,11 @@ class VideoRequest(BaseModel):
     video_url: str   
 
 
+class PlaylistRequest(BaseModel):
+    id: str
+    playlist_url: str
+
+
 class AiPromptRequest(BaseModel):
     id: str
     ai_generated_prompt: str
@@ -0,0 +1,98 @@
+"""Per-prompt event fan-out over Redis pub/sub.
+
+Writers publish to prompt_events:<id>. Each backend process keeps a single
+pattern subscription and hands messages to the in-process queues of the
+clients streaming that prompt, so open streams do not hold Redis connections.
+"""
+
+import json
+import asyncio
+from internal_redis.redis_client import get_redis
+
+EVENT_CHANNEL_PREFIX = "prompt_events:"
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def channel_for(prompt_id: str) -> str:
+    return f"{EVENT_CHANNEL_PREFIX}{prompt_id}"
+
+
+def encode_event(event: str, data: dict) -> str:
+    return json.dumps({"event": event, "data": data})
+
+
+async def publish_event(prompt_id: str, event: str, data: dict):
+    await publish_events([(prompt_id, event, data)])
+
+
+async def publish_events(events: list[tuple[str, str, dict]]):
+    # Best effort and one round trip for a batch of (prompt_id, event, data);
+    # the write itself already succeeded and clients resync from the snapshot
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for prompt_id, event, data in events:
+            pipe.publish(channel_for(prompt_id), encode_event(event, data))
+        await pipe.execute()
+    except Exception as e:
+        print(f"Failed to publish events: {e}")
+
+
+class EventBroadcaster:
+    def __init__(self):
+        self.subscribers: dict[str, set[asyncio.Queue]] = {}
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            pubsub = get_redis().pubsub()
+            try:
+                await pubsub.psubscribe(f"{EVENT_CHANNEL_PREFIX}*")
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self._dispatch(message["channel"][len(EVENT_CHANNEL_PREFIX):], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Event subscription dropped, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def _dispatch(self, prompt_id: str, raw: str):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return
+        for queue in self.subscribers.get(prompt_id, ()):
+            if queue.full():
+                # A stalled client loses its oldest event rather than blocking everyone
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    def subscribe(self, prompt_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.setdefault(prompt_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, prompt_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(prompt_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[prompt_id]
+
+
+broadcaster = EventBroadcaster()
@@ -0,0 +1,46 @@
+"""Read-through cache for small per-prompt read views.
+
+Views are cached as the JSON body the endpoint returns and dropped by the
+write endpoints that change them; the TTL only bounds the damage of a read
+racing a write.
+"""
+
+import os
+import json
+from internal_redis.redis_client import get_redis
+
+VIEW_CACHE_TTL = int(os.getenv("VIEW_CACHE_TTL", "300"))
+
+
+def view_key(view: str, prompt_id: str) -> str:
+    return f"prompt_view:{view}:{prompt_id}"
+
+
+async def cached_view(view: str, prompt_id: str, load) -> dict | None:
+    """
+    Returns the cached body for view, or awaits load() and caches its result.
+    A None result (prompt not found) is not cached.
+    """
+    try:
+        raw = await get_redis().get(view_key(view, prompt_id))
+        if raw is not None:
+            return json.loads(raw)
+    except Exception as e:
+        print(f"View cache read failed: {e}")
+
+    body = await load()
+    if body is not None:
+        try:
+            await get_redis().set(view_key(view, prompt_id), json.dumps(body), ex=VIEW_CACHE_TTL)
+        except Exception as e:
+            print(f"View cache write failed: {e}")
+    return body
+
+
+async def invalidate_views(view: str, prompt_ids: list[str]):
+    if not prompt_ids:
+        return
+    try:
+        await get_redis().delete(*(view_key(view, prompt_id) for prompt_id in prompt_ids))
+    except Exception as e:
+        print(f"View cache invalidation failed: {e}")
@@ -1,17 +1,68 @@
-"""Basic connection example.
+"""Async Redis connection pool, opened and closed with the app lifespan.
 """
 
-import redis
+import redis.asyncio as aioredis
 import os
 REDIS_URL = os.getenv("REDIS_URL")
 REDIS_PORT = os.getenv("REDIS_PORT")
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+PROMPT_QUEUE = "prompt_queue"
 
-r = redis.Redis(
-    host=REDIS_URL,
-    port=REDIS_PORT,
-    decode_responses=True,
-    username="default",
-    password=REDIS_PASSWORD,
-)
-print("redis connected🔴🔴🔴🔴🔴🔴")
+pool: aioredis.ConnectionPool | None = None
+r: aioredis.Redis | None = None
+
+
+async def init_redis():
+    global pool, r
+    pool = aioredis.ConnectionPool(
+        host=REDIS_URL,
+        port=REDIS_PORT,
+        decode_responses=True,
+        username="default",
+        password=REDIS_PASSWORD,
+        max_connections=REDIS_MAX_CONNECTIONS,
+    )
+    r = aioredis.Redis(connection_pool=pool)
+    try:
+        await r.ping()
+        print("redis connected🔴🔴🔴🔴🔴🔴")
+    except Exception as e:
+        # The pool reconnects on demand, so a cold Redis does not block startup
+        print(f"redis ping failed: {e}")
+
+
+async def close_redis():
+    global pool, r
+    if r:
+        await r.aclose()
+    if pool:
+        await pool.disconnect()
+    pool = None
+    r = None
+
+
+def get_redis() -> aioredis.Redis:
+    if r is None:
+        raise RuntimeError("Redis pool is not initialised")
+    return r
+
+
+async def enqueue_prompts(prompt_ids: list[str]):
+    # One round trip no matter how many ids are pushed
+    pipe = get_redis().pipeline(transaction=False)
+    for prompt_id in prompt_ids:
+        pipe.lpush(PROMPT_QUEUE, prompt_id)
+    await pipe.execute()
+
+
+def pool_stats() -> dict:
+    if pool is None:
+        return {"max_connections": REDIS_MAX_CONNECTIONS, "created": 0, "in_use": 0, "idle": 0}
+    stats = {"max_connections": pool.max_connections}
+    # redis-py keeps these lists private; report only the limit if they move
+    in_use = getattr(pool, "_in_use_connections", None)
+    idle = getattr(pool, "_available_connections", None)
+    if in_use is None or idle is None:
+        return stats
+    return {**stats, "created": len(in_use) + len(idle), "in_use": len(in_use), "idle": len(idle)}
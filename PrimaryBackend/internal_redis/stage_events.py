@@ -0,0 +1,193 @@
+"""Consumes stage records from the stage_events stream written by the Job and
+the worker, persists them on their prompt and keeps per-stage latency
+histograms in Redis.
+"""
+
+import os
+import json
+import time
+import socket
+import asyncio
+from datetime import datetime, timezone
+from beanie import PydanticObjectId
+from pymongo import UpdateOne
+from db.model import Prompt
+from internal_redis.redis_client import get_redis
+
+# Must match Job/events.py and worker/services/events.py
+STAGE_EVENT_STREAM = "stage_events"
+STAGE_EVENT_GROUP = "primarybackend"
+STAGE_EVENT_BATCH = int(os.getenv("STAGE_EVENT_BATCH", "200"))
+STAGE_EVENT_BLOCK_MS = 5000
+# Entries a replaced pod read but never acked are taken over after this long
+STAGE_EVENT_CLAIM_IDLE_MS = 60000
+STAGE_EVENT_CLAIM_INTERVAL = 30
+# Upper bounds in seconds; the last bucket catches everything slower
+LATENCY_BUCKETS = [0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800]
+HISTOGRAM_PREFIX = "stage_latency:"
+HISTOGRAM_STAGES = "stage_latency_stages"
+
+
+def bucket_for(seconds: float) -> str:
+    for bound in LATENCY_BUCKETS:
+        if seconds <= bound:
+            return str(bound)
+    return "+Inf"
+
+
+def to_record(event: dict) -> dict:
+    def timestamp(value):
+        return datetime.fromtimestamp(value, tz=timezone.utc) if value is not None else None
+
+    return {
+        "stage": event["stage"],
+        "status": event.get("status", "completed"),
+        "started_at": timestamp(event.get("started_at")),
+        "ended_at": timestamp(event.get("ended_at")),
+        "seconds": event.get("seconds"),
+        "detail": event.get("detail") or {},
+    }
+
+
+async def read_histograms() -> dict:
+    r = get_redis()
+    stages = sorted(await r.smembers(HISTOGRAM_STAGES))
+    pipe = r.pipeline(transaction=False)
+    for stage in stages:
+        pipe.hgetall(f"{HISTOGRAM_PREFIX}{stage}")
+    raw = await pipe.execute()
+
+    histograms = {}
+    for stage, fields in zip(stages, raw):
+        count = int(fields.get("count", 0))
+        total = float(fields.get("sum", 0))
+        cumulative = 0
+        buckets = {}
+        for bound in [str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]:
+            cumulative += int(fields.get(bound, 0))
+            buckets[bound] = cumulative
+        histograms[stage] = {
+            "count": count,
+            "sum": round(total, 3),
+            "mean": round(total / count, 3) if count else None,
+            "failed": int(fields.get("failed", 0)),
+            "buckets": buckets,
+        }
+    return histograms
+
+
+class StageEventConsumer:
+    def __init__(self, consumer_name: str | None = None):
+        self.consumer_name = consumer_name or socket.gethostname()
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _ensure_group(self):
+        try:
+            await get_redis().xgroup_create(STAGE_EVENT_STREAM, STAGE_EVENT_GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _claim_stale(self) -> int:
+        """
+        Takes over entries other consumers read but did not ack in time.
+        Returns how many were claimed.
+        """
+        start_id = "0-0"
+        claimed = 0
+        while True:
+            next_id, ids, *_ = await get_redis().xautoclaim(
+                STAGE_EVENT_STREAM, STAGE_EVENT_GROUP, self.consumer_name,
+                min_idle_time=STAGE_EVENT_CLAIM_IDLE_MS, start_id=start_id, justid=True,
+            )
+            claimed += len(ids)
+            if next_id in ("0-0", b"0-0"):
+                return claimed
+            start_id = next_id
+
+    async def _run(self):
+        # Entries pending on this consumer (its own from before a restart, a
+        # batch that failed, or claimed from pods that went away) are read
+        # from id "0" before new entries are read with ">"
+        last_id = "0"
+        next_claim = 0.0
+        while True:
+            try:
+                await self._ensure_group()
+                while True:
+                    if time.monotonic() >= next_claim:
+                        if await self._claim_stale():
+                            last_id = "0"
+                        next_claim = time.monotonic() + STAGE_EVENT_CLAIM_INTERVAL
+                    response = await get_redis().xreadgroup(
+                        STAGE_EVENT_GROUP, self.consumer_name, {STAGE_EVENT_STREAM: last_id},
+                        count=STAGE_EVENT_BATCH, block=STAGE_EVENT_BLOCK_MS,
+                    )
+                    entries = response[0][1] if response else []
+                    if not entries and last_id == "0":
+                        last_id = ">"
+                        continue
+                    if entries:
+                        await self._handle(entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Stage event consumer error, retrying: {e}")
+                # The failed batch is still pending on this consumer and ">" would never return it
+                last_id = "0"
+                await asyncio.sleep(1)
+
+    async def _handle(self, entries: list):
+        records_by_id: dict[str, list[dict]] = {}
+        histogram = get_redis().pipeline(transaction=False)
+        for _, fields in entries:
+            try:
+                event = json.loads(fields["event"])
+                record = to_record(event)
+                prompt_id = event["prompt_id"]
+            except Exception as e:
+                print(f"Skipping malformed stage event: {e}")
+                continue
+            records_by_id.setdefault(prompt_id, []).append(record)
+            if record["seconds"] is not None:
+                key = f"{HISTOGRAM_PREFIX}{record['stage']}"
+                histogram.sadd(HISTOGRAM_STAGES, record["stage"])
+                histogram.hincrby(key, bucket_for(record["seconds"]), 1)
+                histogram.hincrby(key, "count", 1)
+                histogram.hincrbyfloat(key, "sum", record["seconds"])
+                if record["status"] == "failed":
+                    histogram.hincrby(key, "failed", 1)
+
+        operations = []
+        now = datetime.utcnow()
+        for prompt_id, records in records_by_id.items():
+            try:
+                object_id = PydanticObjectId(prompt_id)
+            except Exception:
+                print(f"Skipping stage events for invalid id {prompt_id}")
+                continue
+            operations.append(UpdateOne(
+                {"_id": object_id},
+                {"$push": {"stage_events": {"$each": records}}, "$set": {"updatedAt": now}},
+            ))
+        if operations:
+            await Prompt.get_pymongo_collection().bulk_write(operations, ordered=False)
+        await histogram.execute()
+        # Ack only after both writes: a crash redelivers the batch (at-least-once)
+        # instead of losing records
+        await get_redis().xack(STAGE_EVENT_STREAM, STAGE_EVENT_GROUP, *(entry_id for entry_id, _ in entries))
+
+
+consumer = StageEventConsumer()
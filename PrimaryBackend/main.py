@@ -1,26 +1,48 @@
+import asyncio
 import uvicorn
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from pydantic import BaseModel
-from db.database import init_db
+from db.database import init_db, close_db
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
+from internal_redis.redis_client import init_redis, close_redis
+from internal_redis.events import broadcaster
+from internal_redis.stage_events import consumer as stage_event_consumer
+from services import dedup
 from routes.prompt import router
+from routes.health import router as health_router
+from routes.events import router as events_router
 
 load_dotenv()
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    await init_redis()
+    broadcaster.start()
+    stage_event_consumer.start()
+    seeding = asyncio.create_task(dedup.seed_index_in_background()) if dedup.DEDUP_ENABLED else None
+    yield
+    if seeding:
+        seeding.cancel()
+    await stage_event_consumer.stop()
+    await broadcaster.stop()
+    await close_redis()
+    await close_db()
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(router)
+app.include_router(health_router)
+app.include_router(events_router)
 
 @app.get("/")
 def index():
     return {"message":"hi there"}
 
 
-
-@app.on_event("startup")
-async def start_db():
-    await init_db()
-
 # origin=[
 #     "http://localhost:3000",
 #     "https://prompt2-video.vercel.app",
@@ -0,0 +1,69 @@
+import json
+import asyncio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from beanie import PydanticObjectId
+from db.model import Prompt
+from internal_redis.events import broadcaster
+
+router = APIRouter()
+
+# A comment line every so often keeps proxies from closing an idle stream
+KEEPALIVE_SECONDS = 15
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.get("/c/events")
+async def stream_events(request: Request, id: str | None = None):
+    if not id:
+        raise HTTPException(status_code=400, detail="Missing 'id' query parameter")
+
+    try:
+        req_id = PydanticObjectId(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+
+    # Subscribe before reading the snapshot so nothing published in between is lost
+    queue = broadcaster.subscribe(id)
+    try:
+        prompt_data = await Prompt.get(req_id)
+    except Exception:
+        broadcaster.unsubscribe(id, queue)
+        raise
+    if not prompt_data:
+        broadcaster.unsubscribe(id, queue)
+        raise HTTPException(status_code=404, detail="Prompt not found")
+
+    snapshot = {
+        "ai_generated_prompt": prompt_data.full_ai_generated_prompt(),
+        "playlist_url": prompt_data.playlist_url,
+        "video_url": prompt_data.cloudinary_url,
+        "video_status": prompt_data.video_status.value,
+    }
+
+    async def events():
+        try:
+            yield format_sse("snapshot", snapshot)
+            if snapshot["video_url"]:
+                return
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(message["event"], message["data"])
+                # The final URL is the last thing a job reports
+                if message["event"] == "video_url":
+                    return
+        finally:
+            broadcaster.unsubscribe(id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
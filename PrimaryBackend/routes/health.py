@@ -0,0 +1,46 @@
+import time
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from db import database
+from internal_redis import redis_client
+from internal_redis.stage_events import read_histograms
+
+router = APIRouter()
+
+
+async def _check(ping) -> dict:
+    started = time.perf_counter()
+    try:
+        await ping()
+        return {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 2)}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+@router.get("/health")
+async def health():
+    async def ping_mongo():
+        if database.client is None:
+            raise RuntimeError("MongoDB is not connected")
+        await database.client.admin.command("ping")
+
+    checks = {
+        "mongo": await _check(ping_mongo),
+        "redis": await _check(lambda: redis_client.get_redis().ping()),
+    }
+    healthy = all(check["ok"] for check in checks.values())
+    return JSONResponse(status_code=200 if healthy else 503, content={"status": "ok" if healthy else "degraded", **checks})
+
+
+@router.get("/metrics/redis")
+async def redis_metrics():
+    return redis_client.pool_stats()
+
+
+@router.get("/metrics/stages")
+async def stage_metrics():
+    """
+    Per-stage latency histograms (cumulative bucket counts, in seconds)
+    across every prompt processed so far.
+    """
+    return await read_histograms()
@@ -1,40 +1,182 @@
-from fastapi import APIRouter, HTTPException
-from db.validation import PromptRequest, VideoRequest, AiPromptRequest
-from db.model import Prompt, VideoStatus
+import os
+import json
+import asyncio
+import base64
+import hashlib
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from db.validation import PromptRequest, BatchPromptRequest, VideoRequest, AiPromptRequest, PlaylistRequest
+from db.model import Prompt, VideoStatus, PromptPlanView, PromptVideoView, PromptListItem, PromptStagesView, join_ai_generated_prompt
 from beanie import PydanticObjectId
-from internal_redis.redis_client import r
+from pymongo import UpdateOne
+from internal_redis.redis_client import enqueue_prompts
+from internal_redis.events import publish_event, publish_events
+from internal_redis.read_cache import cached_view, invalidate_views
+from services import dedup
 
 router = APIRouter()
 
+MAX_PROMPT_BATCH = int(os.getenv("MAX_PROMPT_BATCH", "100"))
+MAX_PAGE_SIZE = 100
+
+
+def etag_response(request: Request, body: dict) -> Response:
+    etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=body, headers=headers)
+
 
 @router.post("/c/prompt")
 async def receive_prompt(request: PromptRequest):
     print(f"Received prompt: {request.prompt}")
 
-    new_prompt = Prompt(prompt=request.prompt)
+    normalized = dedup.normalize_prompt(request.prompt)
+    hashed = dedup.prompt_hash(normalized)
+    if dedup.DEDUP_ENABLED and request.reuse:
+        existing = await dedup.find_duplicate(hashed)
+        if existing:
+            if existing.cloudinary_url:
+                return {"status": "completed", "id": str(existing.id), "cloudinary_url": existing.cloudinary_url, "deduplicated": True}
+            # Still rendering: the client follows the job that is already running
+            return {"status": "received", "id": str(existing.id), "deduplicated": True}
+
+    new_prompt = Prompt(id=PydanticObjectId(), prompt=request.prompt, prompt_hash=hashed)
+    if dedup.DEDUP_ENABLED and request.reuse:
+        claimed_by = await dedup.claim(hashed, str(new_prompt.id))
+        if claimed_by:
+            return {"status": "received", "id": claimed_by, "deduplicated": True}
+
     await new_prompt.insert()
     # Push the new ID to Redis
-    r.lpush("prompt_queue", str(new_prompt.id))
+    await enqueue_prompts([str(new_prompt.id)])
+
+    response = {"status": "received", "id": str(new_prompt.id)}
+    if dedup.DEDUP_ENABLED:
+        # Suggestions only; the job is already queued, so a failed lookup is not an error
+        try:
+            similar = await dedup.find_similar(normalized)
+        except Exception as e:
+            print(f"Similar prompt lookup failed: {e}")
+            similar = []
+        if similar:
+            response["similar"] = similar
+    await asyncio.to_thread(dedup.index.add, str(new_prompt.id), normalized)
+    return response
+
+
+@router.post("/c/prompts")
+async def receive_prompts(request: BatchPromptRequest):
+    if not request.prompts:
+        raise HTTPException(status_code=400, detail="No prompts given")
+    if len(request.prompts) > MAX_PROMPT_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_PROMPT_BATCH} prompts per batch")
+
+    print(f"Received batch of {len(request.prompts)} prompts")
+    # Batches are explicit backfills, so they always start new jobs
+    normalized = [dedup.normalize_prompt(text) for text in request.prompts]
+    new_prompts = [
+        Prompt(id=PydanticObjectId(), prompt=text, prompt_hash=dedup.prompt_hash(norm))
+        for text, norm in zip(request.prompts, normalized)
+    ]
+    await Prompt.insert_many(new_prompts)
+    ids = [str(prompt.id) for prompt in new_prompts]
+    await enqueue_prompts(ids)
+    await asyncio.to_thread(dedup.index.add_many, list(zip(ids, normalized)))
+
+    return {"status": "received", "ids": ids}
+
+
+def encode_cursor(item: PromptListItem) -> str:
+    raw = f"{item.createdAt.isoformat()}|{item.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, PydanticObjectId]:
+    created_at, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(created_at), PydanticObjectId(id)
+
 
-    return {"status": "received", "id": str(new_prompt.id)}
+@router.get("/c/prompts")
+async def list_prompts(
+    status: VideoStatus | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: int = 20,
+    cursor: str | None = None,
+):
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = {}
+    if status:
+        query["video_status"] = status.value
+    if since or until:
+        query["createdAt"] = {}
+        if since:
+            query["createdAt"]["$gte"] = since
+        if until:
+            query["createdAt"]["$lt"] = until
+    if cursor:
+        try:
+            created_at, last_id = decode_cursor(cursor)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # Keyset paging: strictly after the last item in (createdAt, _id) order
+        query["$or"] = [
+            {"createdAt": {"$lt": created_at}},
+            {"createdAt": created_at, "_id": {"$lt": last_id}},
+        ]
+
+    items = await Prompt.find(query).sort(
+        [("createdAt", -1), ("_id", -1)]
+    ).limit(limit + 1).project(PromptListItem).to_list()
+
+    next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+    return {
+        "items": [item.model_dump(mode="json") for item in items[:limit]],
+        "next_cursor": next_cursor,
+    }
+
+
+async def set_prompt_fields(id: str, fields: dict):
+    # A targeted $set, so stage records and plan chunks pushed concurrently
+    # are not overwritten the way a full-document save() would
+    try:
+        object_id = PydanticObjectId(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+    result = await Prompt.get_pymongo_collection().update_one(
+        {"_id": object_id}, {"$set": {**fields, "updatedAt": datetime.utcnow()}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Prompt not found")
 
 
 @router.post("/c/video_url")
 async def receive_video(request: VideoRequest):
     print(f"Received video: {request.video_url}")
-    prompt_data = await Prompt.get(PydanticObjectId(request.id))
-    if not prompt_data:
-        raise HTTPException(status_code=404, detail="Prompt not found")
+    await set_prompt_fields(request.id, {
+        "cloudinary_url": request.video_url,
+        "video_status": VideoStatus.COMPLETED.value,
+    })
+    await invalidate_views("cloudinary_url", [request.id])
+    await publish_event(request.id, "video_url", {"video_url": request.video_url, "video_status": VideoStatus.COMPLETED.value})
 
-    prompt_data.cloudinary_url = request.video_url
-    prompt_data.video_status = VideoStatus.COMPLETED
-    await prompt_data.save()
+    return {"status": "updated", "id": request.id}
 
-    return {"status": "updated", "id": str(prompt_data.id)}
 
+@router.post("/c/playlist_url")
+async def receive_playlist(request: PlaylistRequest):
+    print(f"Received playlist: {request.playlist_url}")
+    await set_prompt_fields(request.id, {"playlist_url": request.playlist_url})
+    await publish_event(request.id, "playlist_url", {"playlist_url": request.playlist_url})
 
-@router.get("/c/prompt")
-async def get_prompt(id: str | None = None):
+    return {"status": "updated", "id": request.id}
+
+
+@router.get("/c/playlist_url")
+async def get_playlist_url(id: str | None = None):
     if not id:
         raise HTTPException(status_code=400, detail="Missing 'id' query parameter")
 
@@ -46,10 +188,32 @@ async def get_prompt(id: str | None = None):
     prompt_data = await Prompt.get(req_id)
     if not prompt_data:
         raise HTTPException(status_code=404, detail="Prompt not found")
-    return {"ai_generated_prompt": prompt_data.ai_generated_prompt}
+    return {"playlist_url": prompt_data.playlist_url}
+
+
+@router.get("/c/prompt")
+async def get_prompt(request: Request, id: str | None = None):
+    if not id:
+        raise HTTPException(status_code=400, detail="Missing 'id' query parameter")
+
+    try:
+        req_id = PydanticObjectId(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+
+    async def load():
+        view = await Prompt.find_one(Prompt.id == req_id, projection_model=PromptPlanView)
+        if not view:
+            return None
+        return {"ai_generated_prompt": join_ai_generated_prompt(view.ai_generated_prompt, view.ai_generated_chunks)}
+
+    body = await cached_view("prompt", id, load)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Prompt not found")
+    return etag_response(request, body)
 
 @router.get("/c/cloudinary_url")
-async def get_cloudinary_url(id: str | None = None):
+async def get_cloudinary_url(request: Request, id: str | None = None):
     if not id:
         raise HTTPException(status_code=400, detail="Missing 'id' query parameter")
 
@@ -58,36 +222,87 @@ async def get_cloudinary_url(id: str | None = None):
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid ID format")
 
-    prompt_data = await Prompt.get(req_id)
-    if not prompt_data:
+    async def load():
+        view = await Prompt.find_one(Prompt.id == req_id, projection_model=PromptVideoView)
+        if not view:
+            return None
+        return {"cloudinary_url": view.cloudinary_url}
+
+    body = await cached_view("cloudinary_url", id, load)
+    if body is None:
         raise HTTPException(status_code=404, detail="Prompt not found")
-    return {"cloudinary_url": prompt_data.cloudinary_url}
+    return etag_response(request, body)
+
+@router.get("/c/stages")
+async def get_stages(id: str | None = None):
+    if not id:
+        raise HTTPException(status_code=400, detail="Missing 'id' query parameter")
+
+    try:
+        req_id = PydanticObjectId(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+
+    view = await Prompt.find_one(Prompt.id == req_id, projection_model=PromptStagesView)
+    if not view:
+        raise HTTPException(status_code=404, detail="Prompt not found")
+
+    totals = {}
+    for record in view.stage_events:
+        if record.seconds is not None:
+            totals[record.stage] = totals.get(record.stage, 0.0) + record.seconds
+    return {
+        "video_status": view.video_status.value,
+        "stages": [record.model_dump(mode="json") for record in view.stage_events],
+        "seconds_by_stage": {stage: round(seconds, 3) for stage, seconds in totals.items()},
+    }
 
 @router.post("/c/ai_generated_prompt")
 async def receive_ai_generated_prompt(request: list[AiPromptRequest]):
     if not request:
         raise HTTPException(status_code=400, detail="Invalid input format")
 
-    updated_ids = set()
-
+    # Group chunks per id, keeping their order, so each prompt gets one $push
+    chunks_by_id: dict[str, list[str]] = {}
     for item in request:
-        print(f"Received chunk for id {item.id}")
+        chunks_by_id.setdefault(item.id, []).append(item.ai_generated_prompt)
 
-        prompt_data = await Prompt.get(PydanticObjectId(item.id))
-        if not prompt_data:
-            print(f"Prompt not found for id {item.id}, skipping chunk.")
-            continue
+    results = {}
+    object_ids = {}
+    for id in chunks_by_id:
+        try:
+            object_ids[id] = PydanticObjectId(id)
+        except Exception:
+            results[id] = {"status": "invalid_id"}
 
-        if prompt_data.ai_generated_prompt:
-            # Append if already exists. You might want a separator like "\n" or just space
-            prompt_data.ai_generated_prompt += "\n" + item.ai_generated_prompt
-        else:
-            prompt_data.ai_generated_prompt = item.ai_generated_prompt
+    collection = Prompt.get_pymongo_collection()
+    found = await collection.find(
+        {"_id": {"$in": list(object_ids.values())}}, {"_id": 1}
+    ).to_list(None)
+    found_ids = {doc["_id"] for doc in found}
 
-        await prompt_data.save()
-        updated_ids.add(str(prompt_data.id))
+    operations = []
+    now = datetime.utcnow()
+    for id, object_id in object_ids.items():
+        if object_id not in found_ids:
+            print(f"Prompt not found for id {id}, skipping chunk.")
+            results[id] = {"status": "not_found"}
+            continue
+        chunks = chunks_by_id[id]
+        operations.append(
+            UpdateOne(
+                {"_id": object_id},
+                {"$push": {"ai_generated_chunks": {"$each": chunks}}, "$set": {"updatedAt": now}},
+            )
+        )
+        results[id] = {"status": "updated", "chunks": len(chunks)}
 
-    if not updated_ids:
+    if not operations:
         raise HTTPException(status_code=404, detail="No valid prompts found to update")
 
-    return {"status": "updated", "ids": list(updated_ids)}
+    # $push is atomic per document, so chunks arriving concurrently never overwrite each other
+    await collection.bulk_write(operations, ordered=False)
+    updated_ids = [id for id, result in results.items() if result["status"] == "updated"]
+    await invalidate_views("prompt", updated_ids)
+    await publish_events([(id, "plan", {"chunks": chunks_by_id[id]}) for id in updated_ids])
+    return {"status": "updated", "ids": updated_ids, "results": results}
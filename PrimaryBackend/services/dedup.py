@@ -0,0 +1,205 @@
+"""Prompt normalization and a local MinHash/LSH index for near-duplicate prompts.
+"""
+
+import os
+import re
+import asyncio
+import hashlib
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+from beanie import PydanticObjectId
+from db.model import Prompt, VideoStatus
+from internal_redis.redis_client import get_redis
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") == "1"
+# Estimated Jaccard similarity of character shingles at or above which prompts are suggested as similar.
+# Near matches are never reused: "... part 1" and "... part 2" score well above this
+DEDUP_SIMILARITY = float(os.getenv("DEDUP_SIMILARITY", "0.8"))
+# How many recent prompts the local index is seeded with at startup
+DEDUP_INDEX_SIZE = int(os.getenv("DEDUP_INDEX_SIZE", "10000"))
+# A pending prompt older than this is assumed stuck and is not attached to
+DEDUP_INFLIGHT_MAX_AGE = int(os.getenv("DEDUP_INFLIGHT_MAX_AGE", str(2 * 3600)))
+# Claims a normalized prompt for a moment so simultaneous submissions share one job
+DEDUP_CLAIM_SECONDS = int(os.getenv("DEDUP_CLAIM_SECONDS", "60"))
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16  # 4 rows per band: pairs around 0.8 similarity collide with high probability
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalize_prompt(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def prompt_hash(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def shingles(normalized: str, size: int = SHINGLE_SIZE) -> set[str]:
+    # Character shingles, since prompts are often too short for word shingles to be stable
+    if len(normalized) <= size:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+# Fixed permutations so signatures are comparable across processes and restarts
+_PERMUTATIONS = [
+    (_hash64(f"a{i}") % (_MERSENNE_PRIME - 1) + 1, _hash64(f"b{i}") % _MERSENNE_PRIME)
+    for i in range(NUM_PERM)
+]
+
+
+def minhash(normalized: str) -> list[int]:
+    hashed = [_hash64(shingle) for shingle in shingles(normalized)]
+    if not hashed:
+        return [_MAX_HASH] * NUM_PERM
+    return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashed) for a, b in _PERMUTATIONS]
+
+
+def similarity(left: list[int], right: list[int]) -> float:
+    return sum(1 for x, y in zip(left, right) if x == y) / NUM_PERM
+
+
+class MinHashIndex:
+    """
+    In-process LSH index from prompt id to MinHash signature. Each replica
+    keeps its own; the indexed prompt_hash field catches exact repeats
+    across replicas.
+    """
+
+    def __init__(self, bands: int = BANDS, threshold: float = DEDUP_SIMILARITY):
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.threshold = threshold
+        self.signatures: dict[str, list[int]] = {}
+        self.buckets: dict[tuple, set[str]] = {}
+        self.lock = threading.Lock()
+
+    def _band_keys(self, signature: list[int]):
+        for band in range(self.bands):
+            yield (band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+
+    def add(self, prompt_id: str, normalized: str):
+        signature = minhash(normalized)
+        with self.lock:
+            self.signatures[prompt_id] = signature
+            for key in self._band_keys(signature):
+                self.buckets.setdefault(key, set()).add(prompt_id)
+
+    def add_many(self, items: list[tuple[str, str]]):
+        for prompt_id, normalized in items:
+            self.add(prompt_id, normalized)
+
+    def remove(self, prompt_id: str):
+        with self.lock:
+            signature = self.signatures.pop(prompt_id, None)
+            if signature is None:
+                return
+            for key in self._band_keys(signature):
+                bucket = self.buckets.get(key)
+                if bucket:
+                    bucket.discard(prompt_id)
+                    if not bucket:
+                        del self.buckets[key]
+
+    def query(self, normalized: str) -> list[tuple[str, float]]:
+        """
+        Returns (prompt_id, estimated similarity) above the threshold, best first.
+        """
+        signature = minhash(normalized)
+        with self.lock:
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates |= self.buckets.get(key, set())
+            scored = [(prompt_id, similarity(signature, self.signatures[prompt_id])) for prompt_id in candidates]
+        matches = [(prompt_id, score) for prompt_id, score in scored if score >= self.threshold]
+        return sorted(matches, key=lambda match: match[1], reverse=True)
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+
+index = MinHashIndex()
+
+
+async def seed_index(limit: int = DEDUP_INDEX_SIZE):
+    collection = Prompt.get_pymongo_collection()
+    cursor = collection.find(
+        {"prompt_hash": {"$ne": None}, "video_status": {"$ne": VideoStatus.FAILED.value}},
+        {"prompt": 1},
+    ).sort("createdAt", -1).limit(limit)
+    items = [(str(doc["_id"]), normalize_prompt(doc["prompt"])) async for doc in cursor]
+    # Signatures cost a few ms each, so keep them off the event loop
+    await asyncio.to_thread(index.add_many, items)
+    print(f"Dedup index seeded with {len(index)} prompt(s)")
+
+
+async def seed_index_in_background(limit: int = DEDUP_INDEX_SIZE):
+    """
+    Run as a task after startup; until it finishes, near-duplicate
+    suggestions only cover prompts submitted since.
+    """
+    try:
+        await seed_index(limit)
+    except Exception as e:
+        print(f"Could not seed dedup index: {e}")
+
+
+def _reusable(prompt: Prompt | None) -> bool:
+    if prompt is None or prompt.video_status == VideoStatus.FAILED:
+        return False
+    if prompt.cloudinary_url:
+        return True
+    return datetime.utcnow() - prompt.createdAt < timedelta(seconds=DEDUP_INFLIGHT_MAX_AGE)
+
+
+async def find_duplicate(hashed: str) -> Prompt | None:
+    """
+    Returns a finished or in-flight prompt with exactly the same normalized text.
+    """
+    existing = await Prompt.find(
+        Prompt.prompt_hash == hashed, Prompt.video_status != VideoStatus.FAILED
+    ).sort(-Prompt.createdAt).first_or_none()
+    return existing if _reusable(existing) else None
+
+
+async def find_similar(normalized: str, limit: int = 3) -> list[dict]:
+    """
+    Returns near-duplicate prompts as suggestions for the client. Similar
+    wording often asks for a different video, so these are never reused.
+    """
+    similar = []
+    for prompt_id, score in await asyncio.to_thread(index.query, normalized):
+        candidate = await Prompt.get(PydanticObjectId(prompt_id))
+        if candidate is None or candidate.video_status == VideoStatus.FAILED:
+            index.remove(prompt_id)
+            continue
+        if _reusable(candidate):
+            similar.append({"id": prompt_id, "similarity": round(score, 2), "cloudinary_url": candidate.cloudinary_url})
+        if len(similar) >= limit:
+            break
+    return similar
+
+
+async def claim(hashed: str, prompt_id: str) -> str | None:
+    """
+    Claims hashed for prompt_id. Returns the id that already holds the claim
+    when another submission of the same text got there first.
+    """
+    key = f"prompt_claim:{hashed}"
+    try:
+        if await get_redis().set(key, prompt_id, nx=True, ex=DEDUP_CLAIM_SECONDS):
+            return None
+        return await get_redis().get(key)
+    except Exception as e:
+        print(f"Dedup claim failed: {e}")
+        return None
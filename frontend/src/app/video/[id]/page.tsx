@@ -20,60 +20,95 @@ export default function VideoPage({ params }: { params: Promise<{ id: string }>
     const [logs, setLogs] = useState<string[]>(['[00:00:01] INFO Initializing...']);
     const [isConsoleExpanded, setIsConsoleExpanded] = useState(false);
 
-    // Polling for AI Prompt
+    // Live updates: one snapshot on connect, then plan chunks, progress and the final URL as they happen
     useEffect(() => {
-        if (aiPrompt) return;
-
-        let intervalId: NodeJS.Timeout;
+        const apiUrl = process.env.NEXT_PUBLIC_API_URL;
+        const log = (line: string) => setLogs(prev => [...prev, `[${new Date().toLocaleTimeString()}] ${line}`]);
+        let source: EventSource | null = null;
+        let retryTimer: ReturnType<typeof setTimeout> | undefined;
+        let retryDelay = 1000;
+        let finished = false;
+
+        const finish = (url: string) => {
+            finished = true;
+            setVideoUrl(url);
+            log('SUCCESS Video Rendered');
+            source?.close();
+        };
 
-        const fetchPrompt = async () => {
+        // One plain read of the same state, used while the stream is down
+        const fetchOnce = async () => {
             try {
-                const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/c/prompt?id=${id}`);
-                if (response.ok) {
-                    const data = await response.json();
-                    // Assuming the backend returns { ai_generated_prompt: "...", title: "..." }
-                    if (data && data.ai_generated_prompt) {
-                        setAiPrompt(data.ai_generated_prompt);
-                        setLogs(prev => [...prev, `[${new Date().toLocaleTimeString()}] SUCCESS AI Context Received`]);
-                        clearInterval(intervalId);
-                    }
+                const [promptRes, videoRes] = await Promise.all([
+                    fetch(`${apiUrl}/c/prompt?id=${id}`),
+                    fetch(`${apiUrl}/c/cloudinary_url?id=${id}`),
+                ]);
+                if (promptRes.ok) {
+                    const data = await promptRes.json();
+                    if (data?.ai_generated_prompt) setAiPrompt(data.ai_generated_prompt);
+                }
+                if (videoRes.ok) {
+                    const data = await videoRes.json();
+                    if (data?.cloudinary_url && !finished) finish(data.cloudinary_url);
                 }
             } catch (error) {
-                console.error("Polling error:", error);
+                console.error("Fallback fetch error:", error);
             }
         };
 
-        intervalId = setInterval(fetchPrompt, 2000);
-        fetchPrompt();
-
-        return () => clearInterval(intervalId);
-    }, [id, aiPrompt]);
-
-    // Polling for Video URL
-    useEffect(() => {
-        let intervalId: NodeJS.Timeout;
-
-        const fetchVideo = async () => {
-            try {
-                const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/c/cloudinary_url?id=${id}`);
-                if (response.ok) {
-                    const data = await response.json();
-                    if (data && data.cloudinary_url) {
-                        setVideoUrl(data.cloudinary_url);
-                        setLogs(prev => [...prev, `[${new Date().toLocaleTimeString()}] SUCCESS Video Rendered`]);
-                        clearInterval(intervalId);
-                    }
-                }
-            } catch (error) {
-                console.error("Video Polling error:", error);
-            }
+        const connect = () => {
+            source = new EventSource(`${apiUrl}/c/events?id=${id}`);
+
+            source.addEventListener('snapshot', (e) => {
+                const data = JSON.parse((e as MessageEvent).data);
+                retryDelay = 1000;
+                // Sent again after every reconnect, so it replaces rather than appends
+                setAiPrompt(data.ai_generated_prompt);
+                if (data.ai_generated_prompt) log('SUCCESS AI Context Received');
+                if (data.video_url) finish(data.video_url);
+            });
+
+            source.addEventListener('plan', (e) => {
+                const data = JSON.parse((e as MessageEvent).data);
+                const chunks: string[] = data.chunks || [];
+                setAiPrompt(prev => [prev, ...chunks].filter(Boolean).join('\n'));
+                log('SUCCESS AI Context Received');
+            });
+
+            source.addEventListener('playlist_url', () => {
+                log('INFO Preview playlist available');
+            });
+
+            source.addEventListener('stage', (e) => {
+                const data = JSON.parse((e as MessageEvent).data);
+                log(`INFO ${data.stage} ${data.status}`);
+            });
+
+            source.addEventListener('video_url', (e) => {
+                const data = JSON.parse((e as MessageEvent).data);
+                finish(data.video_url);
+            });
+
+            source.onerror = () => {
+                // Network drops are retried by EventSource itself, but an HTTP error
+                // (404/502/503, e.g. during a backend rollout) closes the stream for good
+                if (source?.readyState !== EventSource.CLOSED || finished) return;
+                console.error(`Event stream closed, reconnecting in ${retryDelay / 1000}s...`);
+                fetchOnce();
+                retryTimer = setTimeout(() => {
+                    if (!finished) connect();
+                }, retryDelay);
+                retryDelay = Math.min(retryDelay * 2, 30000);
+            };
         };
 
-        // Check every 3 seconds for video
-        intervalId = setInterval(fetchVideo, 3000);
-        fetchVideo();
+        connect();
 
-        return () => clearInterval(intervalId);
+        return () => {
+            finished = true;
+            clearTimeout(retryTimer);
+            source?.close();
+        };
     }, [id]);
 
     // Helper to render the structured AI prompt
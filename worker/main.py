@@ -1,5 +1,8 @@
 import os
 import sys
+import json
+import time
+import signal
 import asyncio
 from dotenv import load_dotenv
 
@@ -7,37 +10,130 @@ from db.database import init_db, get_prompt_by_id
 
 load_dotenv()
 
-from services.redis_client import r
-from services.k8s import create_k8s_job
+from services.redis_client import create_redis
+from services.k8s import create_k8s_job_async, shutdown_k8s_executor, new_job_name, get_batch_client
+from services.admission import JobTracker
+from services.events import record_stage, submitted_at
+
+PROMPT_QUEUE = "prompt_queue"
+# Number of prompts dispatched concurrently
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))
+# BLPOP wakes up this often so consumers notice a shutdown request
+BLPOP_TIMEOUT = int(os.getenv("BLPOP_TIMEOUT", "5"))
+# "job" starts one K8s Job per prompt, "runner" hands prompts to the warm runner Deployment
+DISPATCH_MODE = os.getenv("DISPATCH_MODE", "job")
+JOB_TASK_QUEUE = os.getenv("JOB_TASK_QUEUE", "job_task_queue")
+
 
 def main():
     asyncio.run(run_worker())
 
+
+async def dispatch(prompt_id: str, r, tracker: JobTracker | None = None, slot=None):
+    popped_at = time.time()
+    queued_at = submitted_at(prompt_id)
+    if queued_at:
+        await record_stage(r, prompt_id, "queue_wait", queued_at)
+    prompt_text = await get_prompt_by_id(prompt_id)
+    if not prompt_text:
+        print(f"Prompt not found for ID: {prompt_id}")
+        if slot:
+            await tracker.release(slot)
+        return
+
+    print(f"Fetched Prompt: {prompt_text}")
+    if DISPATCH_MODE == "runner":
+        # Runners take from the right with BLMOVE RIGHT -> LEFT, so LPUSH keeps the task queue FIFO
+        await r.lpush(JOB_TASK_QUEUE, json.dumps({"id": prompt_id, "prompt": prompt_text}))
+        print(f"🔴 Queued task for {prompt_id}")
+        await record_stage(r, prompt_id, "dispatch", popped_at, mode=DISPATCH_MODE)
+        return
+
+    job_name = new_job_name(prompt_id)
+    try:
+        await create_k8s_job_async(prompt_id, prompt_text, job_name)
+        print(f"🔴 Created K8s Job for {prompt_id}")
+        if slot:
+            tracker.bind(slot, job_name)
+        await record_stage(r, prompt_id, "dispatch", popped_at, mode=DISPATCH_MODE, job=job_name)
+    except Exception as k8s_error:
+        print(f"Failed to create K8s job: {k8s_error}")
+        await record_stage(r, prompt_id, "dispatch", popped_at, status="failed", mode=DISPATCH_MODE, error=str(k8s_error))
+        if slot:
+            await tracker.release(slot)
+
+
+async def acquire_slot(tracker: JobTracker, stop: asyncio.Event):
+    """
+    Waits for a free Job slot, or returns None if shutdown starts first.
+    """
+    acquire = asyncio.create_task(tracker.acquire())
+    stopping = asyncio.create_task(stop.wait())
+    done, _ = await asyncio.wait({acquire, stopping}, return_when=asyncio.FIRST_COMPLETED)
+    if acquire in done:
+        stopping.cancel()
+        return acquire.result()
+    acquire.cancel()
+    return None
+
+
+async def consume(consumer_id: int, r, stop: asyncio.Event, tracker: JobTracker | None):
+    while not stop.is_set():
+        slot = None
+        try:
+            # Take a slot before popping, so prompts over the budget stay in Redis
+            if tracker:
+                slot = await acquire_slot(tracker, stop)
+                if slot is None:
+                    break
+            result = await r.blpop(PROMPT_QUEUE, timeout=BLPOP_TIMEOUT)
+            if not result:
+                if slot:
+                    await tracker.release(slot)
+                continue
+            queue_name, prompt_id = result
+            # Finish the prompt we already popped even if shutdown starts meanwhile
+            await dispatch(prompt_id, r, tracker, slot)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[consumer {consumer_id}] Error processing prompt: {e}")
+            if slot:
+                await tracker.release(slot)
+            await asyncio.sleep(1)
+
+
 async def run_worker():
     print("Worker started. Connecting to DB...")
     await init_db()
-    print("Worker ready. Waiting for prompts...")
 
-    while True:
-        try:
-            result = await asyncio.to_thread(r.blpop, "prompt_queue", timeout=0)
-            if result:
-                queue_name, prompt_id = result
-                prompt_id_str = prompt_id
-                prompt_text = await get_prompt_by_id(prompt_id_str)
-                if prompt_text:
-                    print(f"Fetched Prompt: {prompt_text}")
-                    try:
-                        create_k8s_job(prompt_id_str, prompt_text)
-                        print(f"🔴 Created K8s Job for {prompt_id_str}")
-                    except Exception as k8s_error:
-                        print(f"Failed to create K8s job: {k8s_error}")
-                else:
-                    print(f"Prompt not found for ID: {prompt_id_str}")
+    r = create_redis(max_connections=WORKER_CONCURRENCY + 1)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
 
-        except Exception as e:
-            print(f"Error processing prompt: {e}")
-            await asyncio.sleep(1)
+    tracker = None
+    # Runner pods scale on queue depth themselves, so only Job mode needs admission control
+    batch = get_batch_client() if DISPATCH_MODE == "job" else None
+    if batch:
+        tracker = JobTracker(batch)
+        tracker.start()
+        print(f"Admission control: at most {tracker.max_active} active Job(s)")
+    elif DISPATCH_MODE == "job":
+        print("Kubernetes client not available, running without admission control.")
+
+    consumers = [asyncio.create_task(consume(i, r, stop, tracker)) for i in range(WORKER_CONCURRENCY)]
+    print(f"Worker ready in {DISPATCH_MODE} mode. Waiting for prompts with {WORKER_CONCURRENCY} consumer(s)...")
+
+    await stop.wait()
+    print("Shutting down, waiting for in-flight prompts...")
+    await asyncio.gather(*consumers, return_exceptions=True)
+    if tracker:
+        tracker.stop()
+    await r.aclose()
+    shutdown_k8s_executor()
+    print("Worker stopped.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,175 @@
+import os
+import math
+import time
+import asyncio
+import threading
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+from services.k8s import JOB_NAMESPACE, JOB_LABEL_SELECTOR, JOB_CPU_REQUEST
+
+MAX_ACTIVE_JOBS = int(os.getenv("MAX_ACTIVE_JOBS", "4"))
+# Optional total CPU the prompt Jobs may request together, e.g. "16"
+JOB_CPU_BUDGET = os.getenv("JOB_CPU_BUDGET")
+# The watch is restarted from a fresh list this often; each list also
+# reconciles bound slots whose Job the watch never reported
+WATCH_TIMEOUT_SECONDS = int(os.getenv("JOB_WATCH_TIMEOUT_SECONDS", "60"))
+# A bound slot whose Job is missing from the list this long after binding is released
+SLOT_BIND_GRACE_SECONDS = int(os.getenv("JOB_SLOT_BIND_GRACE_SECONDS", "120"))
+
+
+def parse_cpu(quantity: str) -> float:
+    quantity = str(quantity)
+    if quantity.endswith("m"):
+        return int(quantity[:-1]) / 1000
+    return float(quantity)
+
+
+def job_slots() -> int:
+    """
+    How many prompt Jobs may run at once: MAX_ACTIVE_JOBS, further capped by
+    JOB_CPU_BUDGET / JOB_CPU_REQUEST when a CPU budget is set.
+    """
+    slots = MAX_ACTIVE_JOBS
+    if JOB_CPU_BUDGET:
+        slots = min(slots, math.floor(parse_cpu(JOB_CPU_BUDGET) / parse_cpu(JOB_CPU_REQUEST)))
+    return max(1, slots)
+
+
+def is_job_active(job) -> bool:
+    for condition in (job.status.conditions or []) if job.status else []:
+        if condition.type in ("Complete", "Failed") and condition.status == "True":
+            return False
+    return True
+
+
+class Slot:
+    def __init__(self):
+        self.job_name = None
+        self.bound_at = None
+
+
+class JobTracker:
+    """
+    Admission control for prompt Jobs. A background thread lists and then
+    watches the labelled Jobs, so the set of active Jobs is kept locally
+    instead of polled. Consumers take a Slot before popping a prompt, so
+    prompts beyond the budget stay queued in Redis until a Job finishes.
+
+    batch_api and watch_factory can be fakes implementing
+    list_namespaced_job and Watch().stream/stop for tests.
+    """
+
+    def __init__(self, batch_api, max_active: int | None = None, namespace: str = JOB_NAMESPACE,
+                 label_selector: str = JOB_LABEL_SELECTOR, watch_factory=watch.Watch):
+        self.batch_api = batch_api
+        self.max_active = max_active or job_slots()
+        self.namespace = namespace
+        self.label_selector = label_selector
+        self.watch_factory = watch_factory
+        self.active = set()
+        self.slots = set()
+        self.loop = None
+        self.changed = None
+        self.stopped = threading.Event()
+        self.synced = False
+        self.current_watch = None
+
+    def in_use(self) -> int:
+        # Slots whose Job the watch has already reported are counted once
+        pending = sum(1 for slot in self.slots if slot.job_name not in self.active)
+        return len(self.active) + pending
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.changed = asyncio.Condition()
+        threading.Thread(target=self._run, name="job-watch", daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.current_watch:
+            self.current_watch.stop()
+
+    # Runs on the watch thread; state changes are handed to the event loop.
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                jobs = self.batch_api.list_namespaced_job(self.namespace, label_selector=self.label_selector)
+                listed = {job.metadata.name for job in jobs.items}
+                names = {job.metadata.name for job in jobs.items if is_job_active(job)}
+                self.loop.call_soon_threadsafe(self._reset, names, listed)
+
+                self.current_watch = self.watch_factory()
+                for event in self.current_watch.stream(
+                    self.batch_api.list_namespaced_job,
+                    self.namespace,
+                    label_selector=self.label_selector,
+                    resource_version=jobs.metadata.resource_version,
+                    timeout_seconds=WATCH_TIMEOUT_SECONDS,
+                ):
+                    if self.stopped.is_set():
+                        break
+                    job = event["object"]
+                    active = event["type"] != "DELETED" and is_job_active(job)
+                    self.loop.call_soon_threadsafe(self._update, job.metadata.name, active)
+            except ApiException as e:
+                # 410 Gone: our resource version is too old, relist
+                if e.status != 410:
+                    print(f"Job watch failed: {e}")
+                    self.stopped.wait(5)
+            except Exception as e:
+                print(f"Job watch failed: {e}")
+                self.stopped.wait(5)
+
+    def _reset(self, names: set, listed: set):
+        self.active = set(names)
+        self.synced = True
+        # Reconcile against the list rather than trusting that the watch
+        # reported every bound Job: a listed Job holds its own capacity (or
+        # has finished), and one still missing after the grace period was
+        # deleted before it was seen
+        now = time.monotonic()
+        self.slots = {
+            slot for slot in self.slots
+            if slot.job_name is None
+            or (slot.job_name not in listed and now - slot.bound_at < SLOT_BIND_GRACE_SECONDS)
+        }
+        asyncio.ensure_future(self._notify())
+
+    def _update(self, name: str, active: bool):
+        if active:
+            self.active.add(name)
+        else:
+            self.active.discard(name)
+            # The Job finished before the watch ever reported it as active
+            self.slots = {slot for slot in self.slots if slot.job_name != name}
+        self._drop_reported_slots()
+        asyncio.ensure_future(self._notify())
+
+    def _drop_reported_slots(self):
+        # Once the watch reports a slot's Job, the Job itself holds the capacity
+        self.slots = {slot for slot in self.slots if slot.job_name is None or slot.job_name not in self.active}
+
+    async def _notify(self):
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def acquire(self) -> Slot:
+        """
+        Waits until the active Jobs plus reserved slots are below the budget.
+        """
+        async with self.changed:
+            await self.changed.wait_for(lambda: self.synced and self.in_use() < self.max_active)
+            slot = Slot()
+            self.slots.add(slot)
+            return slot
+
+    def bind(self, slot: Slot, job_name: str):
+        slot.job_name = job_name
+        slot.bound_at = time.monotonic()
+        self._drop_reported_slots()
+
+    async def release(self, slot: Slot):
+        self.slots.discard(slot)
+        await self._notify()
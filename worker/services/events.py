@@ -0,0 +1,43 @@
+"""Stage records for the dispatch side of a prompt's timeline.
+"""
+
+import json
+import time
+from bson import ObjectId
+
+# Must match Job/events.py and PrimaryBackend/internal_redis/stage_events.py
+EVENT_CHANNEL_PREFIX = "prompt_events:"
+STAGE_EVENT_STREAM = "stage_events"
+STAGE_EVENT_STREAM_MAXLEN = 100000
+
+
+def submitted_at(prompt_id: str) -> float | None:
+    # Prompt ids are ObjectIds, whose timestamp is when the backend created them
+    try:
+        return ObjectId(prompt_id).generation_time.timestamp()
+    except Exception:
+        return None
+
+
+async def record_stage(r, prompt_id: str, name: str, started_at: float, status: str = "completed", **detail):
+    ended = time.time()
+    data = {
+        "stage": name,
+        "status": status,
+        "started_at": started_at,
+        "ended_at": ended,
+        "seconds": ended - started_at,
+        "detail": detail,
+    }
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.publish(f"{EVENT_CHANNEL_PREFIX}{prompt_id}", json.dumps({"event": "stage", "data": data}))
+        pipe.xadd(
+            STAGE_EVENT_STREAM,
+            {"event": json.dumps({"prompt_id": prompt_id, **data})},
+            maxlen=STAGE_EVENT_STREAM_MAXLEN,
+            approximate=True,
+        )
+        await pipe.execute()
+    except Exception as e:
+        print(f"Failed to record {name} stage: {e}")
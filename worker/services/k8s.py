@@ -1,9 +1,15 @@
 from kubernetes import client, config
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
 import uuid
 
 
 _batch_client = None
+# The kubernetes client is synchronous; its calls run here so a slow API
+# server never blocks the dispatcher's event loop.
+K8S_API_THREADS = int(os.getenv("K8S_API_THREADS", "4"))
+_k8s_executor = ThreadPoolExecutor(max_workers=K8S_API_THREADS, thread_name_prefix="k8s-api")
 
 
 def get_batch_client():
@@ -33,9 +39,30 @@ CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME")
 CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY")
 CLOUDINARY_SECRET_KEY = os.getenv("CLOUDINARY_SECRET_KEY")
 BACKEND_URL = os.getenv("BACKEND_URL")
+# The Job uses Redis as its shared LLM response cache
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_PORT = os.getenv("REDIS_PORT")
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+# "1" makes the Job hand its scenes to the scene worker Deployment
+SCENE_FANOUT = os.getenv("SCENE_FANOUT", "0")
+# "1" makes the Job publish a growing HLS playlist while scenes render
+HLS_ENABLED = os.getenv("HLS_ENABLED", "0")
 
+JOB_NAMESPACE = os.getenv("JOB_NAMESPACE", "default")
+# Every prompt Job carries this label so the admission controller can watch them
+JOB_LABELS = {"app": "prompt2video-job"}
+JOB_LABEL_SELECTOR = "app=prompt2video-job"
+JOB_CPU_REQUEST = os.getenv("JOB_CPU_REQUEST", "2")
+JOB_MEMORY_REQUEST = os.getenv("JOB_MEMORY_REQUEST", "2Gi")
+JOB_CPU_LIMIT = os.getenv("JOB_CPU_LIMIT", "4")
+JOB_MEMORY_LIMIT = os.getenv("JOB_MEMORY_LIMIT", "4Gi")
 
-def create_k8s_job(user_id: str, prompt_text: str):
+
+def new_job_name(user_id: str) -> str:
+    return f"task-{user_id}-{uuid.uuid4().hex[:6]}"
+
+
+def create_k8s_job(user_id: str, prompt_text: str, job_name: str | None = None):
     batch = get_batch_client()
     if not batch:
         raise Exception("Kubernetes client not available. Check configuration.")
@@ -43,19 +70,24 @@ def create_k8s_job(user_id: str, prompt_text: str):
     print("🔴🔴🔴🔴🔴🔴")
     print(user_id)
     print(prompt_text)
-    job_name = f"task-{user_id}-{uuid.uuid4().hex[:6]}"
+    job_name = job_name or new_job_name(user_id)
     job = client.V1Job(
-        metadata=client.V1ObjectMeta(name=job_name),
+        metadata=client.V1ObjectMeta(name=job_name, labels=JOB_LABELS),
         spec=client.V1JobSpec(
             ttl_seconds_after_finished=60,
             backoff_limit=1,
             template=client.V1PodTemplateSpec(
+                metadata=client.V1ObjectMeta(labels=JOB_LABELS),
                 spec=client.V1PodSpec(
                     restart_policy="Never",
                     containers=[
                         client.V1Container(
                             name="worker",
                             image="bicky2005/jobscheduler:v3",
+                            resources=client.V1ResourceRequirements(
+                                requests={"cpu": JOB_CPU_REQUEST, "memory": JOB_MEMORY_REQUEST},
+                                limits={"cpu": JOB_CPU_LIMIT, "memory": JOB_MEMORY_LIMIT},
+                            ),
                             env=[
                                 client.V1EnvVar(name="USER_ID", value=user_id),
                                 client.V1EnvVar(name="USER_PROMPT", value=prompt_text),
@@ -78,6 +110,13 @@ def create_k8s_job(user_id: str, prompt_text: str):
                                     value=CLOUDINARY_SECRET_KEY,
                                 ),
                                 client.V1EnvVar(name="BACKEND_URL", value=BACKEND_URL),
+                                client.V1EnvVar(name="REDIS_URL", value=REDIS_URL),
+                                client.V1EnvVar(name="REDIS_PORT", value=REDIS_PORT),
+                                client.V1EnvVar(
+                                    name="REDIS_PASSWORD", value=REDIS_PASSWORD
+                                ),
+                                client.V1EnvVar(name="SCENE_FANOUT", value=SCENE_FANOUT),
+                                client.V1EnvVar(name="HLS_ENABLED", value=HLS_ENABLED),
                                 client.V1EnvVar(name="PYTHONUNBUFFERED", value="1"),
                             ],
                         )
@@ -86,4 +125,14 @@ def create_k8s_job(user_id: str, prompt_text: str):
             ),
         ),
     )
-    batch.create_namespaced_job(namespace="default", body=job)
+    batch.create_namespaced_job(namespace=JOB_NAMESPACE, body=job)
+    return job_name
+
+
+async def create_k8s_job_async(user_id: str, prompt_text: str, job_name: str | None = None):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_k8s_executor, create_k8s_job, user_id, prompt_text, job_name)
+
+
+def shutdown_k8s_executor():
+    _k8s_executor.shutdown(wait=True)
@@ -1,18 +1,22 @@
-"""Basic connection example.
+"""Async Redis connection pool for the dispatcher.
 """
 
-import redis
+import redis.asyncio as aioredis
 import os
 REDIS_URL = os.getenv("REDIS_URL")
 REDIS_PORT = os.getenv("REDIS_PORT")
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
 
-r = redis.Redis(
-    host=REDIS_URL,
-    port=REDIS_PORT,
-    decode_responses=True,
-    username="default",
-    password=REDIS_PASSWORD,
-)
-print("redis connected🔴🔴🔴🔴🔴🔴")
 
+def create_redis(max_connections: int = 10) -> aioredis.Redis:
+    # Every consumer parks a connection in BLPOP, so size the pool for that
+    pool = aioredis.ConnectionPool(
+        host=REDIS_URL,
+        port=REDIS_PORT,
+        decode_responses=True,
+        username="default",
+        password=REDIS_PASSWORD,
+        max_connections=max_connections,
+    )
+    print("redis connected🔴🔴🔴🔴🔴🔴")
+    return aioredis.Redis(connection_pool=pool)
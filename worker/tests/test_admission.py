@@ -0,0 +1,125 @@
+import queue
+import asyncio
+from types import SimpleNamespace
+
+from services import admission
+from services.admission import JobTracker
+
+EXPIRED = object()
+
+
+def make_job(name, finished=False):
+    conditions = [SimpleNamespace(type="Complete", status="True")] if finished else None
+    return SimpleNamespace(metadata=SimpleNamespace(name=name), status=SimpleNamespace(conditions=conditions))
+
+
+class FakeBatchApi:
+    def __init__(self):
+        self.jobs = []
+        self.lists = 0
+
+    def list_namespaced_job(self, namespace, label_selector=None, **kwargs):
+        self.lists += 1
+        return SimpleNamespace(items=list(self.jobs), metadata=SimpleNamespace(resource_version=str(self.lists)))
+
+
+class FakeWatch:
+    """Yields queued events; EXPIRED ends the stream like a watch timeout."""
+
+    def __init__(self, events):
+        self.events = events
+
+    def stream(self, func, *args, **kwargs):
+        while True:
+            event = self.events.get()
+            if event is EXPIRED:
+                return
+            yield event
+
+    def stop(self):
+        self.events.put(EXPIRED)
+
+
+async def eventually(check, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not check():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+def run_tracker(test, max_active=2):
+    api = FakeBatchApi()
+    events = queue.Queue()
+
+    async def main():
+        tracker = JobTracker(api, max_active=max_active, namespace="ns", label_selector="app=job",
+                             watch_factory=lambda: FakeWatch(events))
+        tracker.start()
+        try:
+            await test(tracker, api, events)
+        finally:
+            tracker.stop()
+
+    asyncio.run(main())
+
+
+def test_admits_up_to_the_budget_and_releases_on_completion():
+    async def test(tracker, api, events):
+        first = await asyncio.wait_for(tracker.acquire(), 1)
+        tracker.bind(first, "job-a")
+        second = await asyncio.wait_for(tracker.acquire(), 1)
+        tracker.bind(second, "job-b")
+
+        events.put({"type": "ADDED", "object": make_job("job-a")})
+        events.put({"type": "ADDED", "object": make_job("job-b")})
+        await eventually(lambda: tracker.active == {"job-a", "job-b"})
+        assert tracker.in_use() == 2
+
+        blocked = asyncio.ensure_future(tracker.acquire())
+        await asyncio.sleep(0.05)
+        assert not blocked.done()
+
+        events.put({"type": "MODIFIED", "object": make_job("job-a", finished=True)})
+        slot = await asyncio.wait_for(blocked, 1)
+        assert tracker.active == {"job-b"}
+        await tracker.release(slot)
+
+    run_tracker(test)
+
+
+def test_resync_after_watch_expiry_clears_slot_of_finished_job():
+    async def test(tracker, api, events):
+        slot = await asyncio.wait_for(tracker.acquire(), 1)
+        tracker.bind(slot, "job-a")
+        # The Job ran and finished without the watch ever reporting it
+        api.jobs = [make_job("job-a", finished=True)]
+        events.put(EXPIRED)
+        await eventually(lambda: api.lists >= 2)
+        await eventually(lambda: not tracker.slots)
+        assert tracker.in_use() == 0
+
+    run_tracker(test, max_active=1)
+
+
+def test_resync_releases_unlisted_slot_after_grace(monkeypatch):
+    async def test(tracker, api, events):
+        slot = await asyncio.wait_for(tracker.acquire(), 1)
+        tracker.bind(slot, "job-a")
+        events.put(EXPIRED)
+        await eventually(lambda: not tracker.slots)
+        assert tracker.in_use() == 0
+
+    monkeypatch.setattr(admission, "SLOT_BIND_GRACE_SECONDS", 0)
+    run_tracker(test, max_active=1)
+
+
+def test_resync_keeps_unlisted_slot_within_grace():
+    async def test(tracker, api, events):
+        slot = await asyncio.wait_for(tracker.acquire(), 1)
+        tracker.bind(slot, "job-a")
+        events.put(EXPIRED)
+        await eventually(lambda: api.lists >= 2)
+        await asyncio.sleep(0.05)
+        assert tracker.slots == {slot}
+
+    run_tracker(test, max_active=1)